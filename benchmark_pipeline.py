@@ -0,0 +1,129 @@
+from synthetic_session import generate_session, write_session, command_fields
+from cleaning_data import FileCleaner
+from cognitive_load import CognitiveLoad
+from export_visuals import export_sessions
+from run_report import peak_rss
+
+import os
+import sys
+import json
+import time
+import datetime
+import platform
+
+# session lengths the pipeline is benchmarked at, in seconds
+SIZES = {'10min': 600, '1h': 3600, '4h': 14400}
+# the benchmark runs in its own folder so its sessions don't mix with real ones
+BENCHMARK_DIR = 'benchmarks'
+
+
+def timed(stage: str, rows: int, function, *args, **kwargs) -> dict:
+    """
+    Runs one stage, a stage that fails is recorded with its error instead of stopping the benchmark
+    :param stage: string
+    :param rows: int: rows the stage goes over
+    :param function: the stage
+    :return: dict: the stage's results
+    """
+    starting_time = time.perf_counter()
+    error = None
+    try:
+        function(*args, **kwargs)
+    except Exception as e:
+        error = repr(e)
+    seconds = time.perf_counter() - starting_time
+    result = {'stage': stage, 'rows': rows, 'seconds': round(seconds, 3),
+              'rows_per_second': round(rows / seconds) if seconds else None, 'peak_rss_mb': peak_rss(),
+              'error': error}
+    print(f'--- {stage}: {result["seconds"]} s, {result["rows_per_second"]} rows/s'
+          f'{f", FAILED {error}" if error else ""} ---')
+    return result
+
+
+def visualize(file_name: str, hz: int, workers: int) -> None:
+    """
+    Exports the visuals of a session, failing like the other stages if any figure failed
+    :param file_name: string
+    :param hz: int
+    :param workers: int
+    :return:
+    """
+    failed = export_sessions([file_name], hz, workers)
+    if failed:
+        raise RuntimeError(f'{len(failed)} figures failed, the first: {failed[0][1]} {failed[0][2]}')
+
+
+def check_sizes(sizes: dict = SIZES, rates: tuple = (60, 150)) -> bool:
+    """
+    Checks every synthetic session is exactly as long as asked for, at every rate
+    :param sizes: dict: {name: seconds}
+    :param rates: tuple: hz
+    :return: bool: whether all of them are
+    """
+    fields = command_fields()
+    passed = True
+    for hz in rates:
+        for size, seconds in sizes.items():
+            rows = len(generate_session(hz, seconds, fields=fields).index)
+            if rows != int(hz * seconds):
+                print(f'--- {size} at {hz} hz: {rows} rows instead of {int(hz * seconds)} ---')
+                passed = False
+    print(f'---=== session sizes {"OK" if passed else "WRONG"} ===---')
+    return passed
+
+
+def benchmark(sizes: dict = SIZES, hz: int = 150, workers: int = 1, log_format: str = 'npy',
+              blink_rate: float = 15, dropout: float = 0.02) -> str:
+    """
+    Generates a synthetic session of every size and times the cleaning, analysis and visuals on it separately,
+    the results are saved as a JSON file in the benchmark folder so runs can be compared
+    :param sizes: dict: {name: seconds}
+    :param hz: int
+    :param workers: int: worker processes of the analysis and the visuals
+    :param log_format: string: csv/npy
+    :param blink_rate: float: blinks per minute
+    :param dropout: float: part of every session lost to breaks
+    :return: string: path of the results file
+    """
+    started = datetime.datetime.now()
+    report = {'started': started.isoformat(timespec='seconds'), 'hz': hz, 'workers': workers,
+              'log_format': log_format, 'blink_rate': blink_rate, 'dropout': dropout,
+              'python': platform.python_version(), 'platform': platform.platform(), 'sizes': {}}
+
+    # every stage works with paths relative to where it runs
+    fields = command_fields()
+    cwd = os.getcwd()
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    os.chdir(BENCHMARK_DIR)
+    try:
+        for folder in ['csv logs', 'analysis/jsons', 'analysis/clean logs', 'analysis/cognitive load logs']:
+            os.makedirs(folder, exist_ok=True)
+
+        for size, seconds in sizes.items():
+            print(f'\n---=== BENCHMARK {size} ===---')
+            name = f'benchmark_{size}'
+            rows = int(seconds * hz)
+            report['sizes'][size] = [
+                timed('generate', rows, write_session, name, hz, seconds, log_format,
+                      blink_rate=blink_rate, dropout=dropout, fields=fields),
+                timed('clean', rows, FileCleaner, name, hz, workers, next_stage=False),
+                timed('analyze', rows, CognitiveLoad, name, hz, workers, next_stage=False),
+                timed('visualize', rows, visualize, name, hz, workers),
+            ]
+    finally:
+        os.chdir(cwd)
+
+    path = f'{BENCHMARK_DIR}/results_{started:%Y%m%d_%H%M%S}.json'
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'---=== benchmark saved to {path} ===---')
+    return path
+
+
+if __name__ == '__main__':
+    # e.g. "10min,1h" for a quicker run
+    chosen = input(f'sizes ({",".join(SIZES)})\n> ')
+    if input('check the session sizes first? y/n\n> ') == 'y' and not check_sizes():
+        sys.exit(1)
+    benchmark({size: SIZES[size] for size in chosen.split(',')} if chosen else SIZES,
+              int(input('hz (150)\n> ') or 150), int(input('workers (1)\n> ') or 1))
@@ -6,7 +6,12 @@ from datetime import datetime
 starting_time = datetime.now()
 
 script = 'main.py'
-args = [script, '--onefile', '-n Gazepoint', '--distpath=EXE/', '--hidden-import=pyodbc']
+args = [script, '-n Gazepoint', '--distpath=EXE/', '--hidden-import=pyodbc']
+
+# a single file unpacks itself every time it's opened, the folder starts much faster
+onefile = input('single file? (slower to start) y/n\n> ')
+if onefile == 'y':
+    args.append('--onefile')
 
 console = input('add a cmd console? y/n\n> ')
 if console != 'y':
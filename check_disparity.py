@@ -0,0 +1,57 @@
+from cognitive_load import CognitiveLoad
+
+import sys
+from math import sqrt
+import numpy as np
+from numpy import nan
+import pandas as pd
+
+
+def disparity_reference(df: pd.DataFrame, s_i: int, e_i: int) -> None:
+    """
+    The row by row disparity the group's calculation replaced (with the y difference squared as well),
+    kept to check it against
+    :param df: dataframe: with a disparity column
+    :param s_i: int: starting index
+    :param e_i: int: ending index
+    :return:
+    """
+    while s_i <= e_i:
+        if df.at[s_i, 'LPOGV'] == 1 and df.at[s_i, 'RPOGV'] == 1:
+            df.at[s_i, 'disparity'] = sqrt((df.at[s_i, 'RPOGX'] - df.at[s_i, 'LPOGX']) ** 2 +
+                                           (df.at[s_i, 'RPOGY'] - df.at[s_i, 'LPOGY']) ** 2)
+        s_i += 1
+
+
+def check_disparity(rows: int = 10000, invalid: float = 0.1, seed: int = 0) -> bool:
+    """
+    Checks the disparity of a group against the row by row reference, some rows have an invalid point of gaze
+    :param rows: int
+    :param invalid: float: part of the rows where LPOGV or RPOGV is 0
+    :param seed: int
+    :return: bool: whether they're the same (NaN where either eye is invalid)
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({column: rng.uniform(0, 1, rows) for column in ['LPOGX', 'RPOGX', 'LPOGY', 'RPOGY']})
+    df['LPOGV'] = (rng.random(rows) > invalid).astype(int)
+    df['RPOGV'] = (rng.random(rows) > invalid).astype(int)
+    df['disparity'] = nan
+
+    # a group in the middle, the rows around it stay NaN
+    s_i, e_i = rows // 10, rows - rows // 10
+    expected = df.copy()
+    disparity_reference(expected, s_i, e_i)
+    load = CognitiveLoad.__new__(CognitiveLoad)
+    load.df = df
+    load.disparity(s_i, e_i)
+
+    invalid_rows = int(((df['LPOGV'] == 0) | (df['RPOGV'] == 0)).sum())
+    passed = np.allclose(df['disparity'], expected['disparity'], rtol=0, atol=1e-12, equal_nan=True)
+    print(f'--- disparity of {rows} rows ({invalid_rows} with an invalid eye) against the reference: '
+          f'{"OK" if passed else "DIFFERENT"} ---')
+    return passed
+
+
+if __name__ == '__main__':
+    # the group's disparity against the row by row reference, on a few invalid parts
+    sys.exit(not all([check_disparity(), check_disparity(5000, 0.5, 3)]))
@@ -1,10 +1,10 @@
-from cognitive_load import CognitiveLoad
+from log_files import find_log, load_log, save_log
+from run_report import stage
 
-import pandas as pd
+import numpy as np
 import math
 import json
 import os
-from datetime import datetime
 
 # dictionary of valid groups
 gaze_groups_dict = {}
@@ -29,6 +29,30 @@ def bridge_formula(mms: float, mme: float, r: int, tr: int) -> float:
     return result
 
 
+def is_blink(blink_rows, hz: int):
+    """
+    A break in the data is a blink if it's shorter than half a second (works on arrays of run lengths as well)
+    :param blink_rows: int or array: how many rows is the break
+    :param hz: int
+    :return: bool: blink is true
+    """
+    return blink_rows <= (hz * 0.5) + 1
+
+
+def invalid_runs(lpmmv: np.ndarray, rpmmv: np.ndarray) -> tuple:
+    """
+    Run-length encodes the rows where both pupils are invalid, the first row is never part of a run
+    :param lpmmv: array: left pupil validity
+    :param rpmmv: array: right pupil validity
+    :return: tuple: arrays of starting indexes and ending indexes (exclusive) of every invalid run
+    """
+    invalid = ~((lpmmv == 1) | (rpmmv == 1))
+    invalid[:1] = False
+    padded = np.concatenate(([False], invalid, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+
 def add_to_dict(key: int, start: float, end: float, blinks: list, s_i: int, e_i: int) -> None:
     """
     Responsible for the JSON detailing basic info of the group as well as blink times
@@ -56,135 +80,124 @@ def add_to_dict(key: int, start: float, end: float, blinks: list, s_i: int, e_i:
 
 
 class FileCleaner:
-    def __init__(self, file_name: str, hz: int):
+    def __init__(self, file_name: str, hz: int, workers: int = 1, next_stage: bool = True):
         """
         This class is initiated right after the data stream is stopped and cleans, trims and categorizes
         the data in a new CSV file as well as a JSON file of the gaze groups' properties
         :param file_name: string
         :param hz: int
+        :param workers: int: number of processes analyzing groups afterwards
+        :param next_stage: bool: start the analysis when done
         """
         print('\n---=== CLEANING DATA ===---')
-        self.clean_starting_time = datetime.now()
         self.file_name = file_name
         self.hz = hz
-        self.df = pd.read_csv(f'csv logs/{self.file_name}.csv')
-        print('---=== finished loading file (cleaning) ===---')
-        self.index = 1
-        self.output_df = pd.DataFrame()
-        self.blink_trim_cnt_list = []
-        self.blink_trim = int(math.ceil(0.05 * self.hz))
-        self.edge_trim = int(2 * self.hz)
-        self.blink_starting_index = int()
-        self.blinks_list = []
-
-        # start cleaning
-        self.get_gaze_groups()
-
-    def get_gaze_groups(self, searching=True) -> None:
+        self.workers = workers
+        self.next_stage = next_stage
+        # the groups of a file cleaned before in the same run aren't part of this one
+        gaze_groups_dict.clear()
+        with stage(self.file_name, 'clean') as span:
+            self.log_format = find_log(f'csv logs/{self.file_name}')
+            self.df = load_log(f'csv logs/{self.file_name}')
+            span['rows'] = len(self.df.index)
+            print('---=== finished loading file (cleaning) ===---')
+            self.group_ranges = []
+            self.blink_trim_cnt_list = []
+            self.blink_trim = int(math.ceil(0.05 * self.hz))
+            self.edge_trim = int(2 * self.hz)
+
+            # start cleaning
+            self.get_gaze_groups()
+            span['groups'] = len(gaze_groups_dict)
+
+        # start cognitive load, imported here so the GUI (which only needs is_blink) starts without it
+        if self.next_stage:
+            from cognitive_load import CognitiveLoad
+            CognitiveLoad(self.file_name, self.hz, self.workers)
+
+    def get_gaze_groups(self) -> None:
         """
-        This is the main action of the class, we iterate over the file searching for valid data,
-        when we encounter a break we check if it's a blink. when a longer break is found we
-        add the group to the dictionary only if it's above 10 seconds, and when we reach the end of the file
-        the save function is called and the next process class (analyzing) is initiated.
-        :param searching: bool
+        This is the main action of the class, we split the file into runs of invalid data and check if each
+        run is a blink. every longer break ends a group, the group is added to the dictionary only if it's
+        above 10 seconds, and when we reach the end of the file the save function is called.
         :return:
         """
-        starting_index = self.index + self.edge_trim
-        self.blinks_list = []
-        while searching:
-            try:
-                if self.df.at[self.index, 'LPMMV'] == 1 or self.df.at[self.index, "RPMMV"] == 1:
-                    self.index += 1
-                    continue
-            except KeyError:
-                self.save()
-            else:
-                if self.is_blink():
-                    continue
-                else:
-                    if self.blink_starting_index - starting_index >= 10 * self.hz:
-                        self.output_df = \
-                            self.output_df.append(self.df.iloc[starting_index:self.blink_starting_index])
-                        add_to_dict(
-                            len(gaze_groups_dict.keys()) + 1,
-                            self.df.at[starting_index, 'sim_time'],
-                            self.df.at[self.blink_starting_index - 1, 'sim_time'],
-                            self.blinks_list,
-                            starting_index, self.blink_starting_index - 1)
-                    try:
-                        self.get_gaze_groups()
-                    except IndexError:
-                        self.save()
-
-    def is_blink(self, blink_rows=0) -> bool:
-        """
-        This function checks if a break is a blink or not, while gathering more info
-        :param blink_rows: int
-        :return: bool: blink is true
+        starts, ends = invalid_runs(self.df['LPMMV'].to_numpy(), self.df['RPMMV'].to_numpy())
+        if len(ends) and ends[-1] == len(self.df.index):
+            # the file ended in the middle of a break
+            starts, ends = starts[:-1], ends[:-1]
+        sim_time = self.df['sim_time'].to_numpy()
+
+        blinks = is_blink(ends - starts, self.hz)
+        blink_starts, blink_ends = starts[blinks], ends[blinks]
+        break_starts, break_ends = starts[~blinks], ends[~blinks]
+
+        trim = np.arange(1, self.blink_trim + 1)
+        self.blink_trim_cnt_list = np.concatenate(
+            (blink_starts[:, None] - trim, blink_ends[:, None] + trim - 1), axis=1).ravel().tolist()
+
+        self.bridge_blink_eyemm(blink_starts, blink_ends)
+
+        # every break ends the group that started after the previous one
+        group_froms = np.concatenate(([0], break_ends[:-1]))
+        for group_from, blink_starting_index in zip(group_froms.tolist(), break_starts.tolist()):
+            starting_index = max(group_from, 1) + self.edge_trim
+            if blink_starting_index - starting_index >= 10 * self.hz:
+                self.group_ranges.append((starting_index, blink_starting_index))
+                lo, hi = np.searchsorted(blink_starts, [group_from, blink_starting_index])
+                add_to_dict(
+                    len(gaze_groups_dict.keys()) + 1,
+                    float(sim_time[starting_index]),
+                    float(sim_time[blink_starting_index - 1]),
+                    sim_time[blink_starts[lo:hi]].tolist(),
+                    starting_index, blink_starting_index - 1)
+
+        self.save()
+
+    def bridge_blink_eyemm(self, starts: np.ndarray, ends: np.ndarray) -> None:
         """
-        while self.df.at[self.index, 'LPMMV'] == 0 and self.df.at[self.index, 'RPMMV'] == 0:
-            blink_rows += 1
-            self.index += 1
-        else:
-            self.blink_starting_index = self.index - blink_rows
-            if blink_rows <= (self.hz * 0.5) + 1:
-                self.blinks_list.append(self.df.at[self.blink_starting_index, 'sim_time'])
-
-                for x in range(1, self.blink_trim + 1):
-                    self.blink_trim_cnt_list.append(self.blink_starting_index - x)
-                    self.blink_trim_cnt_list.append((self.index + x) - 1)
-
-                self.bridge_blink_eyemm(blink_rows, self.blink_starting_index, self.index)
-                return True
-            else:
-                return False
-
-    def bridge_blink_eyemm(self, rows: int, start: float, end: float) -> None:
-        """
-        If a blink is detected this function bridges the pupil dilation while the eye was closed
-        :param rows: int: how many rows is the blink
-        :param start: float: starting time
-        :param end: float: ending time
+        Bridges the pupil dilation of every detected blink at once while the eye was closed,
+        the value after each blink is the first one that changed from the value at its start
+        :param starts: array: starting index of every blink
+        :param ends: array: ending index (exclusive) of every blink
         :return:
         """
-        lpmm_start = self.df.at[start, "LPMM"]
-        rpmm_start = self.df.at[start, "RPMM"]
-
-        new_end = end
-        lpmm_end = self.df.at[end, "LPMM"]
-        while lpmm_end == lpmm_start:
-            new_end += 1
-            lpmm_end = self.df.at[new_end, "LPMM"]
-
-        new_end = end
-        rpmm_end = self.df.at[end, "RPMM"]
-        while rpmm_end == rpmm_start:
-            new_end += 1
-            rpmm_end = self.df.iloc[new_end]["RPMM"]
-
-        for n in range(1, rows + 1):
-            l_result = bridge_formula(lpmm_start, lpmm_end, n, rows)
-            self.df.at[start + n, 'LPMM'] = l_result
-            r_result = bridge_formula(rpmm_start, rpmm_end, n, rows)
-            self.df.at[start + n, 'RPMM'] = r_result
+        rows = ends - starts
+        # every bridged row, and its position inside its blink
+        positions = np.repeat(starts, rows) + np.arange(rows.sum()) - np.repeat(np.cumsum(rows) - rows, rows) + 1
+        r = positions - np.repeat(starts, rows)
+        tr = np.repeat(rows, rows)
+
+        for column in ['LPMM', 'RPMM']:
+            values = self.df[column].to_numpy(dtype=float, copy=True)
+            mms = values[starts]
+
+            # if the value right after the blink didn't change, take the next change in the column
+            # (or the last row if it never changes again)
+            changes = np.append(np.flatnonzero(values[1:] != values[:-1]) + 1, len(values) - 1)
+            next_change = changes[np.minimum(np.searchsorted(changes, ends, side='right'), len(changes) - 1)]
+            mme = np.where(values[ends] == mms, values[next_change], values[ends])
+
+            values[positions] = bridge_formula(np.repeat(mms, rows), np.repeat(mme, rows), r, tr)
+            self.df[column] = values
 
     def save(self) -> None:
         """
-        Saves the clean file and a JSON to their designated directories, trims a couple of rows before and after
-        each blink in the file and initiates the analyzing class
+        Saves the clean file and a JSON to their designated directories, the clean file is every valid group
+        without a couple of rows before and after each blink, taken from the data in one go
         :return:
         """
         with open(f'analysis/jsons/{self.file_name}.json', 'w+') as f:
             json.dump(gaze_groups_dict, f, indent=2, separators=(',', ': '))
         print('--- saved json ---')
-        self.output_df = self.output_df[~self.output_df['CNT'].isin(self.blink_trim_cnt_list)]
+        mask = np.zeros(len(self.df.index), dtype=bool)
+        for start, end in self.group_ranges:
+            mask[start:end] = True
+        mask &= ~self.df['CNT'].isin(self.blink_trim_cnt_list).to_numpy()
+        self.output_df = self.df[mask]
         print("--- trimmed around blinks ---")
-        self.output_df.to_csv(f'analysis/clean logs/{self.file_name}_clean.csv', index=False)
-        print('--- saved clean csv ---')
-        print(f'---=== time elapsed cleaning = {datetime.now() - self.clean_starting_time} ===---')
-
-        # start cognitive load
-        CognitiveLoad(self.file_name, self.hz)
+        save_log(self.output_df, f'analysis/clean logs/{self.file_name}_clean', self.log_format)
+        print(f'--- saved clean {self.log_format} ---')
 
 
 if __name__ == '__main__':
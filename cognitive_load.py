@@ -1,151 +1,376 @@
-from export_visuals import ExportVisuals
+from log_files import find_log, load_log, save_log
+from run_report import stage
 
-import datetime
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import pandas as pd
-from math import sqrt, ceil
-from numpy import nan, repeat
+from math import ceil
+import numpy as np
+from numpy import nan
 import pywt
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional, without it the fixation kernel runs as plain python
+    def njit(func):
+        return func
+
+# columns a group is analyzed from, and the columns it fills
+GROUP_COLUMNS = ['LPMM', 'RPMM', 'sim_time', 'BPOGX', 'BPOGY', 'LPOGX', 'LPOGY', 'LPOGV',
+                 'RPOGX', 'RPOGY', 'RPOGV']
+RESULT_COLUMNS = ['disparity', 'bkmin', 'lpp', 'rpp', 'l_ica', 'r_ica']
+
+# ICA wavelet and the number of rows it's calculated over at once (even, so blocks start on a coefficient)
+WAVELET = pywt.Wavelet('db32')
+ICA_BLOCK = 2 ** 16
+
 # creates folders if needed
 if not os.path.exists("analysis/cognitive load logs/"):
     os.makedirs('analysis/cognitive load logs')
 
 
-def calc_distance(x1: float, x2: float, y1: float, y2: float) -> float:
+def calc_distance(x1, x2, y1, y2):
     """
-    Basic distance formula
-    :param x1: float
-    :param x2: float
-    :param y1: float
-    :param y2: float
-    :return: float: resulting distance
+    Basic distance formula, works on single floats as well as whole arrays
+    :param x1: float or array
+    :param x2: float or array
+    :param y1: float or array
+    :param y2: float or array
+    :return: float or array: resulting distance
     """
-    distance = sqrt((x2-x1)**2 + (y2-y1)*2)
+    distance = np.sqrt((x2-x1)**2 + (y2-y1)**2)
     return distance
 
 
+def window_means(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Mean of the previous window of values (ignoring NaN) for every position after the first window,
+    cumulative sums make it one pass over the array
+    :param values: array
+    :param window: int: number of rows in the window
+    :return: array: len(values) - window means
+    """
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0], np.cumsum(np.where(valid, values, 0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums[window:-1] - sums[:-window - 1]) / (counts[window:-1] - counts[:-window - 1])
+
+
+@njit
+def fixation_kernel(x: np.ndarray, y: np.ndarray, x_degree: int, y_degree: int, fdi: int, min_rows: int) -> tuple:
+    """
+    Single pass over the gaze points of a group, a fixation starts at a point and lasts as long as the next points
+    stay in the area around it. a point outside the area is a short deviation if the point fdi rows later is back
+    inside, otherwise the next fixation starts there
+    :param x: array: gaze x in pixels
+    :param y: array: gaze y in pixels
+    :param x_degree: int: pixels from the starting point that count as the fixation area
+    :param y_degree: int
+    :param fdi: int: fixation deviation index
+    :param min_rows: int: minimum rows after the starting point for a fixation to count
+    :return: tuple: arrays of starting index, rows and deviations of every fixation
+    """
+    n = len(x)
+    starts = np.empty(n // max(min_rows, 1) + 1, dtype=np.int64)
+    rows = np.empty_like(starts)
+    deviations = np.empty_like(starts)
+    count = 0
+
+    i = 0
+    while i < n:
+        j = i + 1
+        dev = 0
+        while j < n:
+            if abs(x[j] - x[i]) <= x_degree and abs(y[j] - y[i]) <= y_degree:
+                j += 1
+            elif j + fdi < n and abs(x[j + fdi] - x[i]) <= x_degree and abs(y[j + fdi] - y[i]) <= y_degree:
+                j += fdi
+                dev += 1
+            else:
+                break
+        if j - i - 1 >= min_rows:
+            starts[count], rows[count], deviations[count] = i, j - i - 1, dev
+            count += 1
+        i = j
+
+    return starts[:count], rows[:count], deviations[:count]
+
+
+def ica_rate(values: np.ndarray, hz: int, block: int = ICA_BLOCK) -> np.ndarray:
+    """
+    The ICA peak rate of a group calculated block by block, every block's DWT gets a margin of the wavelet's filter
+    length on both sides so its coefficients are the same as the whole group's, and the 5 seconds window is
+    a cumulative sum carried over from the previous block
+    :param values: array: pupil dilation of the group
+    :param hz: int
+    :param block: int: number of rows calculated at once
+    :return: array: peaks per second for the past 5 seconds of every row
+    """
+    n = len(values)
+    window = 5 * hz
+    margin = WAVELET.dec_len + 2
+    rates = np.full(n, nan)
+    carry = np.zeros(0, dtype=int)
+
+    for start in range(0, n, block):
+        end = min(start + block, n)
+        lo, hi = max(start - margin, 0), min(end + margin, n)
+
+        # rolling mean of 2, the first row of the group has no row before it
+        smoothed = (values[max(lo - 1, 0):hi - 1] + values[max(lo, 1):hi]) / 2
+        if lo == 0:
+            smoothed = np.concatenate(([nan], smoothed))
+
+        (_, cd) = pywt.dwt(smoothed, WAVELET)
+        first = (start - lo) // 2
+        peaks = cd[first:first + (end - start + 1) // 2] >= 0.069
+        # every coefficient covers two rows
+        doubled = np.concatenate((carry, np.repeat(peaks.astype(int), 2)[:end - start]))
+
+        sums = np.concatenate(([0], np.cumsum(doubled)))
+        ends = np.arange(len(carry), len(doubled)) + 1
+        full = ends >= window
+        # divide by 5 to get rate/second for last 5 seconds, and by 2 because the 1's are doubled
+        rates[start:end][full] = (sums[ends[full]] - sums[ends[full] - window]) / 10
+
+        carry = doubled[-(window - 1):]
+
+    return rates
+
+
+def analyze_shared_group(names: dict, rows: int, hz: int, s_i: int, e_i: int, length: float, blinks: list) -> dict:
+    """
+    Runs in a worker process, analyzes a single group straight from the shared column buffers
+    and writes its results back into them
+    :param names: dict: shared memory name of every column
+    :param rows: int: number of rows in the whole file
+    :param hz: int
+    :param s_i: int: starting index
+    :param e_i: int: ending index
+    :param length: float: group length in seconds
+    :param blinks: list: blink times of the group
+    :return: dict: the group's fixation columns
+    """
+    buffers = {column: shared_memory.SharedMemory(name=name) for column, name in names.items()}
+    try:
+        columns = {column: np.ndarray((rows,), dtype=float, buffer=shm.buf) for column, shm in buffers.items()}
+
+        worker = CognitiveLoad.__new__(CognitiveLoad)
+        worker.set_parameters(hz)
+        worker.df = pd.DataFrame({column: values[s_i:e_i + 1].copy() for column, values in columns.items()})
+        worker.analyze_group(0, e_i - s_i, length, blinks)
+
+        for column in RESULT_COLUMNS:
+            columns[column][s_i:e_i + 1] = worker.df[column].to_numpy(dtype=float)
+        # the buffers can't be closed while arrays still point at them
+        del columns
+        return {column: values[0] for column, values in worker.fixation_columns.items() if values}
+    finally:
+        for shm in buffers.values():
+            shm.close()
+
+
 class CognitiveLoad:
-    def __init__(self, file_name: str, hz: int):
+    def __init__(self, file_name: str, hz: int, workers: int = 1, next_stage: bool = True):
         """
         Initiated after the cleaning process is done and creates two files:
         1. the data combined with cognitive load values (pupil disparity, blinks per minute,
         smoothed pupil dilation and average ICA for both pupils seperatly)
         2. A file of all fixations
-        The main action of this process happens here, iterating over every gaze group and calculating those values
+        The main action of this process happens here, iterating over every gaze group and calculating those values,
+        with more than one worker the groups are analyzed in parallel processes
         :param file_name: string
         :param hz: int
+        :param workers: int: number of processes analyzing groups
+        :param next_stage: bool: export the visuals when done
         """
         print('\n---=== ANALYZING DATA ===---')
-        self.cog_starting_time = datetime.datetime.now()
+        self.next_stage = next_stage
         self.file_name = file_name
+        with stage(self.file_name, 'analyze') as span:
+            self.set_parameters(hz, workers)
+            self.pupil_minimums = []
+            self.log_format = find_log(f'analysis/clean logs/{file_name}_clean')
+            self.df = load_log(f'analysis/clean logs/{file_name}_clean')
+            span['rows'] = len(self.df.index)
+            print('---=== finished loading file (cognitive) ===---')
+            self.df.insert(1, 'disparity', nan)
+            self.df.insert(2, 'bkmin', 0)
+            self.df.insert(3, 'lpp', nan)
+            self.df.insert(4, 'rpp', nan)
+            self.df.insert(5, 'l_ica', nan)
+            self.df.insert(6, 'r_ica', nan)
+            with open(f'analysis/jsons/{self.file_name}.json', 'r') as f:
+                self.config = json.load(f)
+            print('---=== finished loading json (cognitive) ===---')
+
+            # the CNTs sorted once, so every group's rows are found with a binary search
+            self.cnt_order = np.argsort(self.df['CNT'].to_numpy(), kind='stable')
+            self.sorted_cnt = self.df['CNT'].to_numpy()[self.cnt_order]
+
+            groups = []
+            for group in self.config.items():
+                starting_index, end_index = self.resolve_group(group[1]['start_CNT'], group[1]['end_CNT'])
+                if starting_index is None:
+                    print(f'--- {group[0]} was trimmed away ---')
+                    continue
+
+                print(f'--- {starting_index}, {end_index} CNTS({self.df.at[starting_index, "CNT"]}, '
+                      f'{self.df.at[end_index, "CNT"]}) ---')
+                groups.append((starting_index, end_index, group[1]['length'],
+                               list(group[1]['blinks'].values())))
+
+            if self.workers > 1 and len(groups) > 1:
+                self.analyze_parallel(groups)
+            else:
+                for group in groups:
+                    self.analyze_group(*group)
+
+            self.div_pupil_minimum()
+            self.save_file()
+            span['groups'] = len(groups)
+
+        # start visualizing, matplotlib and scipy are only imported when there's something to draw
+        if self.next_stage:
+            from export_visuals import export_sessions
+            export_sessions([self.file_name], self.hz, self.workers)
+
+    def set_parameters(self, hz: int, workers: int = 1) -> None:
+        """
+        The analysis parameters, apart from the constructor so worker processes can analyze without loading
+        the files
+        :param hz: int
+        :param workers: int
+        :return:
+        """
         self.hz = hz
+        self.workers = workers
         self.screen_w, self.screen_h = 1920, 1080
         self.minute_index = 60 * self.hz
-        self.pupil_minimums = []
-        self.df = pd.read_csv(f'analysis/clean logs/{file_name}_clean.csv')
-        print('---=== finished loading file (cognitive) ===---')
-        self.df.insert(1, 'disparity', nan)
-        self.df.insert(2, 'bkmin', 0)
-        self.df.insert(3, 'lpp', nan)
-        self.df.insert(4, 'rpp', nan)
-        self.df.insert(5, 'l_ica', nan)
-        self.df.insert(6, 'r_ica', nan)
-        with open(f'analysis/jsons/{self.file_name}.json', 'r') as f:
-            self.config = json.load(f)
-        print('---=== finished loading json (cognitive) ===---')
 
         # fixation deviation index (fdi) relevant only for 150 hz, equivalent to roughly 30ms
         # and degrees to number of pixels that count as a fixation area (2.5%: 48px and 27px)
         self.fdi = 5
         self.x_degree, self.y_degree = ceil(0.025*self.screen_w), ceil(0.025*self.screen_h)
-        self.fixation_df = pd.DataFrame(columns=['starting time', 'duration', 'x', 'y', 'deviations'])
-
-        for group in self.config.items():
-            self.length = group[1]['length']
-            starting_cnt = group[1]['start_CNT']
-            end_cnt = group[1]['end_CNT']
-
-            while starting_cnt >= 0:
-                try:
-                    starting_index = self.df.index[self.df['CNT'] == starting_cnt].tolist()[0]
-                    break
-                except IndexError:
-                    starting_cnt += 1
-            while end_cnt >= 0:
-                try:
-                    end_index = self.df.index[self.df['CNT'] == end_cnt].tolist()[0]
-                    break
-                except IndexError:
-                    end_cnt -= 1
-
-            print(f'--- {starting_index}, {end_index} CNTS({starting_cnt}, {end_cnt}) ---')
-
-            self.pupil_dilation(starting_index + 3 * self.hz, end_index)
-            self.disparity(starting_index, end_index)
-
-            if self.length > 60:
-                blink_times_list = list(group[1]['blinks'].values())
-                self.blink_rate(starting_index * self.minute_index, end_index, blink_times_list)
-
-            if self.hz >= 150:
-                self.ica(starting_index, end_index)
-                self.fixations(starting_index, end_index)
-
-        self.div_pupil_minimum()
-        self.save_file()
+        self.fixation_columns = {'starting time': [], 'duration': [], 'x': [], 'y': [], 'deviations': []}
 
-    def pupil_dilation(self, s_i: int, e_i: int) -> None:
+    def analyze_group(self, s_i: int, e_i: int, length: float, blinks: list) -> None:
         """
-        Smooths each pupil's dilation with a sliding mean window of 3 seconds
+        Calculates every cognitive load value of a single gaze group
         :param s_i: int: starting index
         :param e_i: int: ending index
+        :param length: float: group length in seconds
+        :param blinks: list: blink times of the group
         :return:
         """
-        while s_i <= e_i:
-            three_s_before = s_i - (3 * self.hz)
-            sliced_df = self.df[three_s_before:s_i]
+        self.pupil_dilation(s_i + 3 * self.hz, e_i)
+        self.disparity(s_i, e_i)
 
-            left_average = sliced_df['LPMM'].mean()
-            right_average = sliced_df['RPMM'].mean()
+        if length > 60:
+            self.blink_rate(s_i + self.minute_index, e_i, blinks)
 
-            self.df.at[s_i, 'lpp'] = left_average
-            self.df.at[s_i, 'rpp'] = right_average
+        if self.hz >= 150:
+            self.ica(s_i, e_i)
+            self.fixations(s_i, e_i)
+
+    def analyze_parallel(self, groups: list) -> None:
+        """
+        Sends the groups to a pool of worker processes, the columns are shared with the workers instead of copied
+        and every group writes its results to its own rows. fixations are merged back in CNT order
+        :param groups: list: starting index, ending index, length and blink times of every group
+        :return:
+        """
+        rows = len(self.df.index)
+        buffers = {}
+        try:
+            for column in GROUP_COLUMNS + RESULT_COLUMNS:
+                shm = shared_memory.SharedMemory(create=True, size=max(rows, 1) * 8)
+                np.ndarray((rows,), dtype=float, buffer=shm.buf)[:] = self.df[column].to_numpy(dtype=float)
+                buffers[column] = shm
+            names = {column: shm.name for column, shm in buffers.items()}
+
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(analyze_shared_group, names, rows, self.hz, *group) for group in groups]
+                for future in futures:
+                    for column, values in future.result().items():
+                        self.fixation_columns[column].append(values)
+
+            for column in RESULT_COLUMNS:
+                values = np.ndarray((rows,), dtype=float, buffer=buffers[column].buf)
+                self.df[column] = values.astype(self.df[column].dtype)
+        finally:
+            for shm in buffers.values():
+                shm.close()
+                shm.unlink()
+
+    def resolve_group(self, starting_cnt: int, end_cnt: int) -> tuple:
+        """
+        Finds the rows of a group, CNTs trimmed around blinks are replaced by the nearest surviving row
+        inside the group
+        :param starting_cnt: int: starting CNT
+        :param end_cnt: int: ending CNT
+        :return: tuple: starting and ending index, (None, None) if no row of the group survived
+        """
+        start = np.searchsorted(self.sorted_cnt, starting_cnt, side='left')
+        end = np.searchsorted(self.sorted_cnt, end_cnt, side='right') - 1
+        if start > end:
+            return None, None
+        return int(self.cnt_order[start]), int(self.cnt_order[end])
+
+    def pupil_dilation(self, s_i: int, e_i: int) -> None:
+        """
+        Smooths each pupil's dilation with a sliding mean window of 3 seconds
+        :param s_i: int: starting index
+        :param e_i: int: ending index
+        :return:
+        """
+        if s_i > e_i:
+            return
+        window = 3 * self.hz
+        left = self.df.loc[s_i - window:e_i, 'LPMM'].to_numpy(dtype=float)
+        right = self.df.loc[s_i - window:e_i, 'RPMM'].to_numpy(dtype=float)
 
-            s_i += 1
+        self.df.loc[s_i:e_i, 'lpp'] = window_means(left, window)
+        self.df.loc[s_i:e_i, 'rpp'] = window_means(right, window)
 
     def blink_rate(self, s_i: int, e_i: int, bk_times: list) -> None:
         """
-        If the gaze group is longer than 60 seconds we check the blink rate
+        If the gaze group is longer than 60 seconds we check the blink rate,
+        counting the blinks between a minute before and now for every row
         :param s_i: int: starting index
         :param e_i: int: ending index
         :param bk_times: list: all blink times
         :return:
         """
-        while s_i <= e_i:
-            minute_before_index = s_i - self.minute_index
-            time_now = self.df.at[s_i, 'sim_time']
-            time_before = self.df.at[minute_before_index, 'sim_time']
-            bk_per_min = len([n for n in bk_times if time_before < n < time_now])
-            self.df.at[s_i, 'bkmin'] = bk_per_min
+        if s_i > e_i:
+            return
+        time_now = self.df.loc[s_i:e_i, 'sim_time'].to_numpy()
+        time_before = self.df.loc[s_i - self.minute_index:e_i - self.minute_index, 'sim_time'].to_numpy()
+        bk_times = np.sort(bk_times)
 
-            s_i += 1
+        bk_per_min = np.searchsorted(bk_times, time_now, side='left') - \
+            np.searchsorted(bk_times, time_before, side='right')
+        self.df.loc[s_i:e_i, 'bkmin'] = np.maximum(bk_per_min, 0)
 
     def disparity(self, s_i: int, e_i: int) -> None:
         """
-        Calculates the distance between pupils
+        Calculates the distance between pupils for the whole group at once, only where both points of gaze
+        are valid
         :param s_i: int: starting index
         :param e_i: int: ending index
         :return:
         """
-        while s_i <= e_i:
-            if self.df.at[s_i, 'LPOGV'] == 1 and self.df.at[s_i, 'RPOGV'] == 1:
-                self.df.at[s_i, 'disparity'] = calc_distance(
-                    self.df.at[s_i, 'LPOGX'], self.df.at[s_i, 'RPOGX'],
-                    self.df.at[s_i, 'LPOGY'], self.df.at[s_i, 'RPOGY'])
+        group = self.df.loc[s_i:e_i, ['LPOGX', 'RPOGX', 'LPOGY', 'RPOGY', 'LPOGV', 'RPOGV']]
+        valid = ((group['LPOGV'] == 1) & (group['RPOGV'] == 1)).to_numpy()
+        distance = calc_distance(
+            group['LPOGX'].to_numpy(dtype=float), group['RPOGX'].to_numpy(dtype=float),
+            group['LPOGY'].to_numpy(dtype=float), group['RPOGY'].to_numpy(dtype=float))
 
-            s_i += 1
+        self.df.loc[s_i:e_i, 'disparity'] = np.where(valid, distance, nan)
 
     def ica(self, s_i: int, e_i: int) -> None:
         """
@@ -157,73 +382,29 @@ class CognitiveLoad:
         :param e_i: int: ending index
         :return:
         """
-        series = self.df.loc[s_i:e_i, ['LPMM', 'RPMM']]
-
-        series['LPMM'] = series['LPMM'].rolling(2).mean()
-        series['RPMM'] = series['RPMM'].rolling(2).mean()
-
-        cd_df = pd.DataFrame(columns=['left_cd', 'right_cd'])
-        (left_cA, left_cD) = pywt.dwt(series['LPMM'], 'db32')
-        (right_cA, right_cD) = pywt.dwt(series['RPMM'], 'db32')
-        cd_df['left_cd'], cd_df['right_cd'] = left_cD, right_cD
-        cd_df['left_cd_b'], cd_df['right_cd_b'] = cd_df['left_cd'] >= 0.069, cd_df['right_cd'] >= 0.069
-        cd_df['left_cd_b'], cd_df['right_cd_b'] = cd_df['left_cd_b'].astype(int), cd_df['right_cd_b'].astype(int)
-
-        double_df = pd.DataFrame()
-        double_df['doubled_left'] = repeat(cd_df['left_cd_b'], 2)
-        double_df['doubled_right'] = repeat(cd_df['right_cd_b'], 2)
-        double_df = double_df.reset_index(drop=True)
-
-        double_df['l_res'] = double_df['doubled_left'].rolling(self.hz*5).sum()
-        double_df['r_res'] = double_df['doubled_right'].rolling(self.hz*5).sum()
-        # divide by 2 because the 1's are doubled, and divide by 5 to get rate/second for last 5 seconds
-        double_df['l_res'] = double_df['l_res'] / 10
-        double_df['r_res'] = double_df['r_res'] / 10
-
-        self.df.loc[s_i:e_i, 'l_ica'] = double_df.loc[:e_i-s_i, 'l_res'].values
-        self.df.loc[s_i:e_i, 'r_ica'] = double_df.loc[:e_i-s_i, 'r_res'].values
+        self.df.loc[s_i:e_i, 'l_ica'] = ica_rate(self.df.loc[s_i:e_i, 'LPMM'].to_numpy(dtype=float), self.hz)
+        self.df.loc[s_i:e_i, 'r_ica'] = ica_rate(self.df.loc[s_i:e_i, 'RPMM'].to_numpy(dtype=float), self.hz)
 
     def fixations(self, s_i: int, e_i: int) -> None:
         """
-        Calculates fixations, when out eyes stay in a certain area of the screen for some time
+        Calculates fixations, when out eyes stay in a certain area of the screen for at least 133ms
         takes note of short deviations outside this area
         :param s_i: int: starting index
         :param e_i: int: ending index
         :return:
         """
-        duration = 0
-        deviations = 0
-        dist = 1
-        while s_i <= e_i:
-            x, y = self.df.at[s_i, 'BPOGX'] * self.screen_w, self.df.at[s_i, 'BPOGY'] * self.screen_h
-            new_fix = False
-            while not new_fix:
-                try:
-                    x_a, y_a = self.df.at[s_i + dist, 'BPOGX'] * self.screen_w, \
-                               self.df.at[s_i + dist, 'BPOGY'] * self.screen_h
-                    if abs(x_a - x) <= self.x_degree and abs(y_a - y) <= self.y_degree:
-                        duration += 1/self.hz
-                        dist += 1
-                    else:
-                        x_n, y_n = self.df.at[s_i + self.fdi, 'BPOGX'] * self.screen_w, \
-                                   self.df.at[s_i + self.fdi, 'BPOGY'] * self.screen_h
-                        if abs(x_n - x) <= self.x_degree and abs(y_n - y) <= self.y_degree:
-                            duration += self.fdi * (1/self.hz)
-                            dist += self.fdi
-                            s_i += self.fdi
-                            deviations += 1
-                        else:
-                            if duration >= 0.133:
-                                starting_time = self.df.at[s_i, 'sim_time'] - duration
-                                self.fixation_df.loc[len(self.fixation_df.index)] = \
-                                    [starting_time, duration, x, y, deviations]
-                            duration = 0
-                            deviations = 0
-                            dist = 0
-                            break
-                except KeyError:
-                    break
-            s_i += 1
+        x = self.df.loc[s_i:e_i, 'BPOGX'].to_numpy(dtype=float) * self.screen_w
+        y = self.df.loc[s_i:e_i, 'BPOGY'].to_numpy(dtype=float) * self.screen_h
+        sim_time = self.df.loc[s_i:e_i, 'sim_time'].to_numpy(dtype=float)
+
+        starts, rows, deviations = fixation_kernel(x, y, self.x_degree, self.y_degree, self.fdi,
+                                                   ceil(0.133 * self.hz))
+
+        self.fixation_columns['starting time'].append(sim_time[starts])
+        self.fixation_columns['duration'].append(rows / self.hz)
+        self.fixation_columns['x'].append(x[starts])
+        self.fixation_columns['y'].append(y[starts])
+        self.fixation_columns['deviations'].append(deviations)
 
     def div_pupil_minimum(self) -> None:
         """
@@ -243,20 +424,19 @@ class CognitiveLoad:
 
     def save_file(self) -> None:
         """
-        Saves the files and initiates the next class, visualizations
+        Saves the load file and the fixations
         :return:
         """
-        self.df.to_csv(f'analysis/cognitive load logs/{self.file_name}_load.csv', index=False)
-        print('--- saved load csv ---')
+        save_log(self.df, f'analysis/cognitive load logs/{self.file_name}_load', self.log_format)
+        print(f'--- saved load {self.log_format} ---')
+        self.fixation_df = pd.DataFrame({column: np.concatenate(values) if values else []
+                                         for column, values in self.fixation_columns.items()})
         self.fixation_df = self.fixation_df[(self.fixation_df['x'].between(0, self.screen_w)) &
                                             (self.fixation_df['y'].between(0, self.screen_h))]
-        self.fixation_df.reset.index(drop=True)
+        self.fixation_df = self.fixation_df.reset_index(drop=True)
         self.fixation_df.to_csv(f'analysis/cognitive load logs/{self.file_name}_fixations.csv', index_label='id')
         print('--- saved fixation csv ---')
 
-        print(f'---=== time elapsed analyzing {datetime.datetime.now() - self.cog_starting_time} ===---')
-        ExportVisuals(self.file_name, self.hz)
-
 
 if __name__ == '__main__':
     # independent running
@@ -1,46 +1,118 @@
-import sys
+from log_files import load_log
+from heatmap_smoothing import smooth
+from run_report import stage
+
 import pandas as pd
+import matplotlib
+# the figures are only saved, nothing is ever shown on screen
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from scipy.ndimage.filters import gaussian_filter
-from PIL import Image
+from matplotlib.collections import LineCollection
 import numpy as np
-from math import floor
 import os
 import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# the figures every export makes, by the name of the function drawing them
+FIGURES = ['gaze_path', 'heatmap', 'pupil_dilation_graph', 'disparity_graph']
+# rolling mean windows (rows) of the line graphs, and their size (inches) and dpi
+PUPIL_WINDOW = 6666
+DISPARITY_WINDOW = 150
+GRAPH_SIZE = (50, 20)
+GRAPH_DPI = 300
+# every level of the heatmap pyramid halves the previous one, cached next to the full matrix
+PYRAMID_LEVELS = 4
+
+
+def heatmap_counts(x: np.ndarray, y: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Counts the gaze samples in every pixel of the screen
+    :param x: numpy array: gaze x between 0 and 1
+    :param y: numpy array: gaze y between 0 and 1
+    :param width: int
+    :param height: int
+    :return: numpy array: height x width matrix of counts
+    """
+    # 1 is still on the screen, it's counted in the last pixel
+    columns = np.minimum((x * width).astype(np.intp), width - 1)
+    rows = np.minimum((y * height).astype(np.intp), height - 1)
+    counts = np.bincount(rows * width + columns, minlength=height * width)
+    return counts.astype(np.uint32).reshape(height, width)
+
+
+def downsample(data: np.ndarray) -> np.ndarray:
+    """
+    Halves a matrix of counts by summing every 2x2 block (an odd last row or column is summed on its own)
+    :param data: numpy array
+    :return: numpy array
+    """
+    height, width = data.shape
+    padded = np.zeros((height + height % 2, width + width % 2), dtype=data.dtype)
+    padded[:height, :width] = data
+    return padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).sum(axis=(1, 3), dtype=data.dtype)
+
+
+def min_max_decimate(x: np.ndarray, y: np.ndarray, buckets: int) -> tuple:
+    """
+    Keeps the lowest and highest point of every bucket of a line so a long line can be drawn with about
+    as many points as there are pixels across without losing its peaks
+    :param x: numpy array
+    :param y: numpy array: without NaN
+    :param buckets: int: number of buckets (the horizontal pixel count)
+    :return: tuple: the kept x and y in their original order
+    """
+    size = len(y) // buckets
+    if size <= 2:
+        return x, y
+    # the rows after the last full bucket are a bucket of their own
+    full = buckets * size
+    blocks = y[:full].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    kept = [offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1)]
+    if full < len(y):
+        kept.append(full + np.array([y[full:].argmin(), y[full:].argmax()]))
+    kept = np.unique(np.concatenate(kept))
+    return x[kept], y[kept]
 
 
 class ExportVisuals:
-    def __init__(self, file_name: str, hz: int):
+    def __init__(self, file_name: str, hz: int, figures: list = FIGURES, pupil_window: int = PUPIL_WINDOW,
+                 disparity_window: int = DISPARITY_WINDOW):
         """
         This class is initiated after the analyzing process is finished
         the main results are the path and heatmap images, graphs often need individual altering to look presentable
         exports everything to a folder with the same name as the file name
         :param file_name: string
         :param hz: int
+        :param figures: list: names of the figures to draw, all of them by default
+        :param pupil_window: int: rows in the rolling mean of the pupil dilation graph
+        :param disparity_window: int: rows in the rolling mean of the disparity graph
         """
         print('\n---=== EXPORTING VISUALS ===---')
-        self.exp_starting_time = datetime.datetime.now()
         self.file_name = file_name
         self.hz = hz
         self.screen_w, self.screen_h = 1920, 1080
-        self.raw_df = pd.read_csv(f'analysis/cognitive load logs/{self.file_name}_load.csv')
+        self.pupil_window, self.disparity_window = pupil_window, disparity_window
+        self.raw_df = load_log(f'analysis/cognitive load logs/{self.file_name}_load')
         self.fix_df = pd.read_csv(f'analysis/cognitive load logs/{self.file_name}_fixations.csv')
         print(f'---=== finished loading {self.file_name} fixations ===---')
         print(f'--- data length {len(self.raw_df)} ---')
 
-        # creates the folders
-        if not os.path.exists('analysis/img/'):
-            os.makedirs('analysis/img')
-        if not os.path.exists(f'analysis/img/{self.file_name}'):
-            os.makedirs(f'analysis/img/{self.file_name}')
+        # creates the folders (other processes might be drawing the same file)
+        os.makedirs(f'analysis/img/{self.file_name}', exist_ok=True)
 
-        self.gaze_path()
-        self.heatmap()
-        self.pupil_dilation_graph()
-        self.disparity_graph()
+        for figure in figures:
+            self.draw(figure)
 
-        print(f'---=== time elapsed visualizing {datetime.datetime.now() - self.exp_starting_time}')
-        sys.exit()
+    def draw(self, figure: str) -> None:
+        """
+        Draws one figure, every figure is a stage of its own in the run report (they might be drawn in different
+        processes)
+        :param figure: string: one of FIGURES
+        :return:
+        """
+        with stage(self.file_name, f'visualize {figure}', len(self.raw_df.index)):
+            getattr(self, figure)()
 
     def gaze_path(self) -> None:
         """
@@ -50,55 +122,65 @@ class ExportVisuals:
         df = self.raw_df[(self.raw_df["BPOGX"].between(0, 1)) & (self.raw_df['BPOGY'].between(0, 1)) &
                          (self.raw_df['BPOGV'] == 1)]
 
-        bpogx_list = df['BPOGX'].tolist()
-        bpogy_list = df['BPOGY'].tolist()
+        # a line for every full second of data, all drawn at once
+        seconds = len(df) // self.hz
+        points = df[['BPOGX', 'BPOGY']].to_numpy()[:seconds * self.hz].reshape(seconds, self.hz, 2)
 
         plt.figure(dpi=300)
         plt.axis('off')
-
-        for i in range(0, len(bpogx_list), self.hz):
-            try:
-                plt.plot(bpogx_list[i-self.hz:1], bpogy_list[i-self.hz:i],
-                         c='indigo', alpha=0.03, solid_capstyle='butt')
-            except IndexError:
-                break
+        ax = plt.gca()
+        ax.add_collection(LineCollection(points, colors='indigo', alpha=0.03, capstyle='butt'))
+        ax.autoscale_view()
+        # the image is turned 180 degrees by flipping both axes instead of rotating the saved file
+        ax.invert_xaxis()
+        ax.invert_yaxis()
 
         plt.savefig(f'analysis/img/{self.file_name}/{self.file_name}_gaze_path.png', transparent=False)
-        plt.show(block=False)
         plt.close()
-        im = Image.open(f'analysis/img/{self.file_name}/{self.file_name}_gaze_path.png')
-        out = im.rotate(180)
-        out.save(f'analysis/img/{self.file_name}/{self.file_name}_gaze_path.png')
 
         print('--- finished gaze path ---')
 
-    def heatmap(self) -> None:
+    def heatmap_matrix(self, level: int = 0) -> np.ndarray:
         """
         The first time a data file is made this function creates a .npy array file alongside the JSON that contains
-        a 2D matrix representing the places looked at across the screen
-        Then loads that array and draws a heatmap based on that matrix
-        :return:
+        a 2D matrix representing the places looked at across the screen, and a pyramid of smaller versions of it
+        :param level: int: 0 is the full screen, every level halves the previous one (up to PYRAMID_LEVELS)
+        :return: numpy array: matrix of counts
         """
-        if not os.path.exists(f'analysis/jsons/{self.file_name}_heatmap.npy'):
+        matrix_path = f'analysis/jsons/{self.file_name}_heatmap.npy'
+        pyramid_path = f'analysis/jsons/{self.file_name}_heatmap_pyramid.npz'
+
+        if not os.path.exists(matrix_path):
             print('--- creating npy matrix ---')
-            data = np.zeros([self.screen_h, self.screen_w])
-            heat_df = self.raw_df[self.raw_df['BPOGV'] != 0 &
+            heat_df = self.raw_df[(self.raw_df['BPOGV'] != 0) &
                                   self.raw_df['BPOGX'].between(0, 1) & self.raw_df['BPOGY'].between(0, 1)]
-            heat_df = heat_df.reset_index(drop=True)
-
-            for i in range(len(heat_df)):
-                y, x = floor(heat_df.at[i, 'BPOGY'] * self.screen_h), floor(heat_df.at[i, 'BPOGX'] * self.screen_w)
-                try:
-                    data[y, x] += 1
-                except IndexError:
-                    pass
-            np.save(f'analysis/jsons/{self.file_name}_heatmap.npy', data)
+            data = heatmap_counts(heat_df['BPOGX'].to_numpy(), heat_df['BPOGY'].to_numpy(),
+                                  self.screen_w, self.screen_h)
+            np.save(matrix_path, data)
         else:
-            data = np.load(f'analysis/jsons/{self.file_name}_heatmap.npy')
+            data = np.load(matrix_path)
 
+        if not os.path.exists(pyramid_path):
+            # matrices made before the pyramid was added are float64
+            pyramid = [data.astype(np.uint32)]
+            for _ in range(PYRAMID_LEVELS):
+                pyramid.append(downsample(pyramid[-1]))
+            np.savez(pyramid_path, *pyramid[1:])
+
+        if level == 0:
+            return data
+        with np.load(pyramid_path) as pyramid:
+            return pyramid[f'arr_{level - 1}']
+
+    def heatmap(self) -> None:
+        """
+        Loads the heatmap matrix and draws a heatmap based on it
+        :return:
+        """
+        data = self.heatmap_matrix().astype(np.float32)
         data[data <= 1] = 0
 
-        smooth_data = gaussian_filter(data, sigma=2)
+        smooth_data = smooth(data, sigma=2, dpi=300)
         masked_data = np.ma.masked_where(smooth_data == 0, smooth_data)
 
         plt.figure(dpi=300)
@@ -106,26 +188,37 @@ class ExportVisuals:
 
         plt.axis('off')
         plt.savefig(f'analysis/img/{self.file_name}/{self.file_name}_heat_map.png', transparent=True)
-        plt.show(block=False)
         plt.close()
 
         print('--- finished heatmap ---')
 
+    @staticmethod
+    def line_graph(x: pd.Series, y: pd.Series) -> None:
+        """
+        Draws a line with about 2 points per horizontal pixel, however long the session is
+        :param x: series
+        :param y: series
+        :return:
+        """
+        x, y = x.to_numpy(), y.to_numpy()
+        valid = ~np.isnan(y)
+        x, y = min_max_decimate(x[valid], y[valid], GRAPH_SIZE[0] * GRAPH_DPI)
+
+        plt.figure(figsize=GRAPH_SIZE, dpi=GRAPH_DPI)
+        plt.plot(x, y, c='indigo', alpha=0.5)
+
     def pupil_dilation_graph(self) -> None:
         """
         Basic line graph
         :return:
         """
-        series = self.raw_df[['lpp', 'rpp' 'sim_time']].dropna()
-        mean_val = 6666
+        series = self.raw_df[['lpp', 'rpp', 'sim_time']].dropna()
         series['bpp'] = series[['lpp', 'rpp']].mean(axis=1)
-        data = series['bpp'].rolling(mean_val).mean()
+        data = series['bpp'].rolling(self.pupil_window).mean()
 
-        plt.figure(figsize=(50, 20), dpi=300)
-        plt.plot(series['sim_time'], data, c='indigo', alpha=0.5)
+        self.line_graph(series['sim_time'], data)
 
         plt.savefig(f'analysis/img/{self.file_name}/{self.file_name}_pupil_dilation.png')
-        plt.show(block=False)
         plt.close()
 
         print('--- finished pupil dilation graph ---')
@@ -137,21 +230,81 @@ class ExportVisuals:
         """
         series = self.raw_df[['disparity', 'sim_time']].dropna()
 
-        maximum_val, mean_val = 0.13, 150
+        maximum_val = 0.13
         series = series[series['disparity'] <= maximum_val]
-        data = series['disparity'].rolling(mean_val).mean()
+        data = series['disparity'].rolling(self.disparity_window).mean()
 
-        plt.figure(figsize=(50, 20), dpi=300)
-        plt.plot(series['sim_time'], data, c='indigo', alpha=0.5)
+        self.line_graph(series['sim_time'], data)
 
         plt.savefig(f'analysis/img/{self.file_name}/{self.file_name}_disparity.png')
-        plt.show(block=False)
         plt.close()
         print('--- finished disparity graph ---')
 
 
+def export_figure(file_name: str, hz: int, figure: str, **windows) -> str:
+    """
+    Draws one figure in a worker process
+    :param file_name: string
+    :param hz: int
+    :param figure: string: one of FIGURES
+    :param windows: the rolling mean windows of the graphs (pupil_window, disparity_window)
+    :return: string: the figure's name
+    """
+    ExportVisuals(file_name, hz, [figure], **windows)
+    return figure
+
+
+def export_sessions(file_names: list, hz: int, workers: int = 1, **windows) -> list:
+    """
+    Exports the visuals of any number of sessions, with more than one worker every figure is drawn in its own
+    process
+    A figure that fails is printed and the rest are still drawn
+    :param file_names: list: session file names
+    :param hz: int
+    :param workers: int: number of processes drawing figures
+    :param windows: the rolling mean windows of the graphs (pupil_window, disparity_window)
+    :return: list: (file name, figure, error) of every figure that failed
+    """
+    starting_time = datetime.datetime.now()
+    failed = []
+    if workers <= 1:
+        # the session is loaded once and its figures are drawn one by one
+        for file_name in file_names:
+            try:
+                visuals = ExportVisuals(file_name, hz, [], **windows)
+            except Exception as e:
+                print(f'--- failed loading {file_name}: {e!r} ---')
+                failed.extend((file_name, figure, repr(e)) for figure in FIGURES)
+                continue
+            for figure in FIGURES:
+                try:
+                    visuals.draw(figure)
+                except Exception as e:
+                    print(f'--- failed {figure} of {file_name}: {e!r} ---')
+                    failed.append((file_name, figure, repr(e)))
+                    plt.close('all')
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(export_figure, file_name, hz, figure, **windows): (file_name, figure)
+                       for file_name in file_names for figure in FIGURES}
+            for future in as_completed(futures):
+                file_name, figure = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f'--- failed {figure} of {file_name}: {e!r} ---')
+                    failed.append((file_name, figure, repr(e)))
+    print(f'---=== time elapsed visualizing {len(file_names)} sessions {datetime.datetime.now() - starting_time}')
+    return failed
+
+
 if __name__ == '__main__':
     # this is here mainly because the graphs need to be modified for the final report
     # so, change the rolling window and ceilings and produce the graphs again to your liking :)
     # or make new graphs with the data idk go wild
-    ExportVisuals(input('file_name\n> '), int(input('hz\n> ')))
+    # several sessions can be exported at once, separated with commas
+    export_sessions([name.strip() for name in input('file names\n> ').split(',')], int(input('hz\n> ')),
+                    int(input('workers\n> ') or 1),
+                    pupil_window=int(input(f'pupil dilation rolling window ({PUPIL_WINDOW})\n> ') or PUPIL_WINDOW),
+                    disparity_window=int(input(f'disparity rolling window ({DISPARITY_WINDOW})\n> ') or
+                                         DISPARITY_WINDOW))
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+from record_parser import RecordParser
+
+# seconds to wait for a tracker to connect and acknowledge all the commands
+ACK_TIMEOUT = 5
+
+
+class TrackerProtocol(asyncio.BufferedProtocol):
+    def __init__(self, fields: list):
+        """
+        The connection to a single tracker, the event loop receives straight into the parser's buffer
+        :param fields: list: variable names in the order they're written
+        """
+        self.parser = RecordParser(None, fields)
+        self.expected_acks = 0
+        self.acknowledged = asyncio.Event()
+        self.on_records = None
+        self.on_lost = None
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self.parser.free_space()
+
+    def buffer_updated(self, nbytes: int) -> None:
+        records = self.parser.received(nbytes)
+        if self.expected_acks and self.parser.acks >= self.expected_acks:
+            self.acknowledged.set()
+        if self.on_records is not None:
+            self.on_records(records, self.parser.received_bytes)
+
+    def connection_lost(self, exc: Exception) -> None:
+        if self.on_lost is not None:
+            self.on_lost(exc)
+
+
+class GazepointClient:
+    def __init__(self, host: str, port: int, fields: list):
+        """
+        An asyncio client of the Gazepoint API for one tracker
+        :param host: string
+        :param port: int
+        :param fields: list: variable names in the order they're written
+        """
+        self.host = host
+        self.port = port
+        self.fields = fields
+        self.transport = None
+        self.protocol = None
+        self.on_records = None
+        # set when the tracker closed the connection (or it broke) before we closed it
+        self.lost = None
+        self.closing = False
+
+    async def connect(self, commands: list, timeout: float = ACK_TIMEOUT) -> None:
+        """
+        Connects, sends the SET commands (and ENABLE_SEND_DATA) and waits for all of them to be acknowledged
+        :param commands: list: API commands
+        :param timeout: float: seconds to wait for the connection and for the acknowledgements
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        self.transport, self.protocol = await asyncio.wait_for(
+            loop.create_connection(lambda: TrackerProtocol(self.fields), self.host, self.port), timeout)
+        self.protocol.on_records = self.on_records
+        self.protocol.on_lost = self.connection_lost
+
+        self.protocol.expected_acks = len(commands) + 1
+        for command in commands:
+            self.transport.write(str.encode(f'<SET ID="{command}" STATE="1" />\r\n'))
+        self.transport.write(str.encode('<SET ID="ENABLE_SEND_DATA" STATE="1" />\r\n'))
+        await asyncio.wait_for(self.protocol.acknowledged.wait(), timeout)
+
+    def stream_to(self, on_records) -> None:
+        """
+        Starts passing the records to a callback, called from the event loop for every chunk received
+        (can be set before connecting as well, to get the records from the moment data is enabled)
+        :param on_records: function taking the list of records and the total bytes received
+        :return:
+        """
+        self.on_records = on_records
+        if self.protocol is not None:
+            self.protocol.on_records = on_records
+
+    def connection_lost(self, exc: Exception) -> None:
+        """
+        Called from the event loop when the connection is closed, a connection we didn't close is flagged
+        and printed
+        :param exc: exception the connection broke with, None if the tracker closed it
+        :return:
+        """
+        if self.closing:
+            return
+        self.lost = exc or ConnectionResetError('closed by the tracker')
+        print(f'--- lost the connection to {self.host}:{self.port}: {self.lost!r} ---')
+
+    def close(self) -> None:
+        self.closing = True
+        if self.transport is not None:
+            self.transport.close()
+
+
+async def connect_all(clients: list, commands: list, timeout: float = ACK_TIMEOUT) -> list:
+    """
+    Connects every tracker at the same time
+    :param clients: list: GazepointClients
+    :param commands: list: API commands
+    :param timeout: float
+    :return: list: None for every tracker that's ready, or the exception it failed with
+    """
+    results = await asyncio.gather(*[client.connect(commands, timeout) for client in clients],
+                                   return_exceptions=True)
+    for client, result in zip(clients, results):
+        if result is not None:
+            client.close()
+    return results
+
+
+class TrackerLoop:
+    def __init__(self):
+        """
+        A single asyncio event loop for all the trackers, running in its own thread so the GUI is never blocked
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine):
+        """
+        :param coroutine: coroutine to run on the loop
+        :return: concurrent.futures.Future: its result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, function, *args) -> None:
+        """
+        Calls a function from the loop's thread
+        :param function: function
+        :return:
+        """
+        self.loop.call_soon_threadsafe(function, *args)
+
+    def stop(self) -> None:
+        """
+        Stops the loop once the calls before it (and what they scheduled, e.g. closing the sockets) are done
+        :return:
+        """
+        self.loop.call_soon_threadsafe(self.loop.call_soon, self.loop.stop)
+        self.thread.join()
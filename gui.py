@@ -1,10 +1,17 @@
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+# the ingest counters and live values of every tracker take up to INGEST_LINES and LOAD_LINES wrapped lines
+# under the buttons
+STATUS_POINT_SIZE = 8
+STATUS_LINE_HEIGHT = 16
+INGEST_LINES = 3
+LOAD_LINES = 2
+
 
 class GazepointUI(object):
     def setup_ui(self, gazepoint):
         gazepoint.setObjectName("gazepoint")
-        gazepoint.resize(400, 380)
+        gazepoint.resize(400, 450)
         self.horizontalLayoutWidget = QtWidgets.QWidget(gazepoint)
         self.horizontalLayoutWidget.setGeometry(QtCore.QRect(30, 10, 341, 41))
         self.horizontalLayoutWidget.setObjectName("horizontalLayoutWidget")
@@ -81,6 +88,20 @@ class GazepointUI(object):
         self.buttonSave = QtWidgets.QPushButton(self.horizontalLayoutWidget_6)
         self.buttonSave.setObjectName("buttonSave")
         self.horizontalLayout_6.addWidget(self.buttonSave)
+        status_font = QtGui.QFont()
+        status_font.setPointSize(STATUS_POINT_SIZE)
+        self.labelIngest = QtWidgets.QLabel(gazepoint)
+        self.labelIngest.setGeometry(QtCore.QRect(10, 370, 381, 31))
+        self.labelIngest.setAlignment(QtCore.Qt.AlignCenter)
+        self.labelIngest.setWordWrap(True)
+        self.labelIngest.setFont(status_font)
+        self.labelIngest.setObjectName("labelIngest")
+        self.labelLoad = QtWidgets.QLabel(gazepoint)
+        self.labelLoad.setGeometry(QtCore.QRect(10, 405, 381, 31))
+        self.labelLoad.setAlignment(QtCore.Qt.AlignCenter)
+        self.labelLoad.setWordWrap(True)
+        self.labelLoad.setFont(status_font)
+        self.labelLoad.setObjectName("labelLoad")
         self.easterEgg = QtWidgets.QLabel(gazepoint)
         self.easterEgg.setGeometry(QtCore.QRect(570, 170, 161, 16))
         self.easterEgg.setObjectName("easterEgg")
@@ -97,6 +118,16 @@ class GazepointUI(object):
         self.buttonAck.setText(_translate("gazepoint", "Connect"))
         self.buttonFeed.setText(_translate("gazepoint", "Feed data"))
         self.buttonSave.setText(_translate("gazepoint", "Save and exit"))
+        self.labelIngest.setText(_translate("gazepoint", ""))
+        self.labelLoad.setText(_translate("gazepoint", ""))
         self.easterEgg.setText(_translate("gazepoint", "daniela hamalka was here >:)"))
         self.label.setStyleSheet('font-size: 13pt')
         self.labelHost.setStyleSheet("font-size: 13pt")
+
+    def size_status(self, gazepoint, trackers: int):
+        # every tracker gets its own lines, the window grows to fit them
+        ingest_height = trackers * INGEST_LINES * STATUS_LINE_HEIGHT
+        load_height = trackers * LOAD_LINES * STATUS_LINE_HEIGHT
+        self.labelIngest.setGeometry(QtCore.QRect(10, 370, 381, ingest_height))
+        self.labelLoad.setGeometry(QtCore.QRect(10, 375 + ingest_height, 381, load_height))
+        gazepoint.resize(400, 385 + ingest_height + load_height)
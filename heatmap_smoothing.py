@@ -0,0 +1,161 @@
+import time
+from functools import lru_cache
+import numpy as np
+from scipy.ndimage import correlate1d, gaussian_filter
+from scipy.signal import fftconvolve
+
+# gaussian kernels are cut at 4 sigma like scipy's, above FFT_SIGMA a single FFT beats two 1D passes
+TRUNCATE = 4.0
+FFT_SIGMA = 12
+MODES = ['separable', 'fft', 'downsample']
+
+
+@lru_cache(maxsize=16)
+def gaussian_kernel(sigma: float) -> np.ndarray:
+    """
+    A normalized 1D gaussian kernel, kept for the next matrix smoothed with the same sigma
+    :param sigma: float
+    :return: numpy array: float32 kernel of length 2 * radius + 1
+    """
+    radius = int(TRUNCATE * sigma + 0.5)
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    kernel = (kernel / kernel.sum()).astype(np.float32)
+    kernel.setflags(write=False)
+    return kernel
+
+
+def smooth_separable(data: np.ndarray, sigma: float) -> np.ndarray:
+    """
+    Two 1D passes, the same result as scipy's gaussian_filter
+    :param data: numpy array: float32 matrix
+    :param sigma: float
+    :return: numpy array
+    """
+    kernel = gaussian_kernel(sigma)
+    return correlate1d(correlate1d(data, kernel, axis=0, mode='reflect'), kernel, axis=1, mode='reflect')
+
+
+def smooth_fft(data: np.ndarray, sigma: float) -> np.ndarray:
+    """
+    One FFT convolution with the 2D kernel, the edges are reflected like in the separable mode
+    :param data: numpy array: float32 matrix
+    :param sigma: float
+    :return: numpy array
+    """
+    kernel = gaussian_kernel(sigma)
+    radius = len(kernel) // 2
+    padded = np.pad(data, radius, mode='symmetric')
+    smooth_data = fftconvolve(padded, np.outer(kernel, kernel), mode='valid').astype(np.float32)
+    # the FFT leaves rounding noise where the true result is 0, and 0 is what the heatmap masks
+    smooth_data[np.abs(smooth_data) <= 1e-6 * np.abs(smooth_data).max(initial=0)] = 0
+    return smooth_data
+
+
+def upsample(data: np.ndarray, factor: int, axis: int) -> np.ndarray:
+    """
+    Linear interpolation along one axis, every pixel becomes factor pixels
+    :param data: numpy array
+    :param factor: int
+    :param axis: int
+    :return: numpy array
+    """
+    size = data.shape[axis]
+    # the centers of the new pixels in the coordinates of the old ones
+    x = np.clip((np.arange(size * factor, dtype=np.float32) + 0.5) / factor - 0.5, 0, size - 1)
+    before = np.floor(x).astype(np.intp)
+    after = np.minimum(before + 1, size - 1)
+    shape = [1, 1]
+    shape[axis] = -1
+    weight = (x - before).reshape(shape)
+    start = np.take(data, before, axis=axis)
+    return start + (np.take(data, after, axis=axis) - start) * weight
+
+
+def smooth_downsampled(data: np.ndarray, sigma: float, factor: int) -> np.ndarray:
+    """
+    Averages every factor x factor block, smooths the small matrix and scales it back up,
+    for when the image has fewer pixels than the matrix anyway
+    :param data: numpy array: float32 matrix
+    :param sigma: float
+    :param factor: int
+    :return: numpy array
+    """
+    height, width = data.shape
+    padded = np.zeros((-(-height // factor) * factor, -(-width // factor) * factor), dtype=np.float32)
+    padded[:height, :width] = data
+    small = padded.reshape(padded.shape[0] // factor, factor, padded.shape[1] // factor, factor).mean(axis=(1, 3))
+    small = smooth_separable(small, sigma / factor)
+    return upsample(upsample(small, factor, 0), factor, 1)[:height, :width]
+
+
+def choose_mode(sigma: float, dpi: int, width: int, figure_width: float = 6.4) -> tuple:
+    """
+    Picks the fastest mode that still looks the same in the saved image
+    :param sigma: float
+    :param dpi: int: dpi of the saved figure
+    :param width: int: matrix width
+    :param figure_width: float: figure width in inches (matplotlib's default)
+    :return: tuple: (mode, downsampling factor)
+    """
+    # how many matrix pixels end up in one image pixel, smoothing over less than one of them can't be seen
+    factor = min(int(width / (figure_width * dpi)), int(sigma))
+    if factor >= 2:
+        return 'downsample', factor
+    if sigma > FFT_SIGMA:
+        return 'fft', 1
+    return 'separable', 1
+
+
+def smooth(data: np.ndarray, sigma: float, dpi: int, mode: str = None) -> np.ndarray:
+    """
+    Gaussian smoothing of a heatmap matrix in float32
+    :param data: numpy array
+    :param sigma: float
+    :param dpi: int: dpi of the saved figure
+    :param mode: string: separable/fft/downsample, None picks by sigma and dpi
+    :return: numpy array: float32 smoothed matrix
+    """
+    data = np.asarray(data, dtype=np.float32)
+    chosen, factor = choose_mode(sigma, dpi, data.shape[1])
+    mode = mode or chosen
+    if mode == 'downsample':
+        return smooth_downsampled(data, sigma, max(factor, 2))
+    if mode == 'fft':
+        return smooth_fft(data, sigma)
+    return smooth_separable(data, sigma)
+
+
+def benchmark(sigmas: tuple = (2, 8, 16, 32), shape: tuple = (1080, 1920), samples: int = 500000) -> dict:
+    """
+    Times every mode against scipy's float64 gaussian_filter on a synthetic heatmap
+    :param sigmas: tuple
+    :param shape: tuple: matrix shape
+    :param samples: int: number of gaze samples in the matrix
+    :return: dict: {sigma: {mode: (seconds, largest difference from gaussian_filter relative to its maximum)}}
+    """
+    rng = np.random.default_rng(0)
+    rows = np.clip(rng.normal(shape[0] / 2, shape[0] / 6, samples), 0, shape[0] - 1).astype(int)
+    columns = np.clip(rng.normal(shape[1] / 2, shape[1] / 6, samples), 0, shape[1] - 1).astype(int)
+    data = np.zeros(shape)
+    np.add.at(data, (rows, columns), 1)
+
+    results = {}
+    for sigma in sigmas:
+        starting_time = time.perf_counter()
+        reference = gaussian_filter(data, sigma=sigma)
+        results[sigma] = {'gaussian_filter': (time.perf_counter() - starting_time, 0.0)}
+        for mode in MODES:
+            starting_time = time.perf_counter()
+            smooth_data = smooth(data, sigma, 300, mode)
+            elapsed = time.perf_counter() - starting_time
+            results[sigma][mode] = (elapsed, float(np.abs(smooth_data - reference).max() / reference.max()))
+
+        print(f'--- sigma {sigma} (auto picks {choose_mode(sigma, 300, shape[1])[0]} at 300 dpi) ---')
+        for mode, (elapsed, error) in results[sigma].items():
+            print(f'{mode:>16}: {elapsed * 1000:8.1f} ms, error {error:.1e}')
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,217 @@
+from log_files import SegmentWriter
+from sim_time_sync import SimTimeSync, SimTimeMapping, FIRST_READ_TIMEOUT
+from run_report import stage
+
+import time
+import queue
+import datetime
+
+# how many seconds of records the queue between the socket and the file can hold,
+# and after how long in the queue a record counts as late
+QUEUE_SECONDS = 60
+LATE_AFTER = 1.0
+# how many seconds of records every recording segment holds, at most one segment is lost in a crash
+SEGMENT_SECONDS = 60
+
+
+class IngestMetrics:
+    def __init__(self):
+        """
+        Counters of the ingest pipeline, the socket reader and the file writer each update their own
+        counters so they can be read from the GUI at any time
+        """
+        self.starting_time = time.monotonic()
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.late = 0
+        self.bytes_received = 0
+        self.depth = 0
+        self.max_depth = 0
+        # monotonic times of the first record received and the last one written
+        self.first_received = None
+        self.last_written = None
+        # bytes received when the recording started and at the last summary, the rate is shown over the last
+        # summary so a stall shows up right away
+        self.starting_bytes = 0
+        self.last_time = self.starting_time
+        self.last_bytes = 0
+
+    def start(self) -> None:
+        """
+        Called when the recording starts, the average rate leaves out the time waiting for it
+        :return:
+        """
+        self.starting_time = self.last_time = time.monotonic()
+        self.starting_bytes = self.last_bytes = self.bytes_received
+
+    def queued(self, depth: int) -> None:
+        """
+        Called by the reader after putting a record in the queue
+        :param depth: int: records waiting in the queue
+        :return:
+        """
+        self.received += 1
+        if self.first_received is None:
+            self.first_received = time.monotonic()
+        self.depth = depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def dequeued(self, received_time: float) -> None:
+        """
+        Called by the writer after writing a record
+        :param received_time: float: monotonic time the record was received
+        :return:
+        """
+        self.written += 1
+        self.last_written = time.monotonic()
+        if self.last_written - received_time > LATE_AFTER:
+            self.late += 1
+
+    def average(self) -> float:
+        """
+        :return: float: KB received per second since the recording started
+        """
+        elapsed = max(time.monotonic() - self.starting_time, 1e-9)
+        return (self.bytes_received - self.starting_bytes) / elapsed / 1024
+
+    def summary(self) -> str:
+        """
+        :return: string: the counters in one line, with the KB received per second since the last summary
+        """
+        now, received_bytes = time.monotonic(), self.bytes_received
+        rate = (received_bytes - self.last_bytes) / max(now - self.last_time, 1e-9) / 1024
+        self.last_time, self.last_bytes = now, received_bytes
+        return f'queue {self.depth} (max {self.max_depth}) | received {self.received} | ' \
+               f'written {self.written} | dropped {self.dropped} | late {self.late} | {rate:.1f} KB/s'
+
+
+class Feeder:
+    def __init__(self, file_name: str, paused: bool, sim_sync: SimTimeSync, fields: list, hz: int,
+                 log_format: str = 'csv', segment_seconds: int = SEGMENT_SECONDS, directory: str = 'csv logs'):
+        """
+        This class recieves the data of a tracker and writes it to a file on a different thread so the GUI
+        can continue being responsive, the records come from the trackers' event loop and wait for the writer
+        in a bounded queue so a slow disk doesn't hold up the connection
+        :param file_name: string
+        :param paused: bool
+        :param sim_sync: SimTimeSync: the simulator time the records are stamped with, None to count from 0
+        :param fields: list: variable names of the records (sim_time last)
+        :param hz: int
+        :param log_format: string: csv/npy
+        :param segment_seconds: int: length of the segments the recording is written in
+        :param directory: string: folder of the recordings
+        """
+        self.file_name = file_name
+        self.paused = paused
+        self.sim_sync = sim_sync
+        self.fields = fields
+        self.hz = hz
+        self.log_format = log_format
+        self.segment_seconds = segment_seconds
+        self.directory = directory
+        # the sensor's own clock, when it's sent
+        self.time_index = fields.index('TIME') if 'TIME' in fields else None
+        # records are only written with gaze (the second variable isn't 0) and pupils up to 6 mm
+        self.valid_indexes = [1, fields.index('LPMM'), fields.index('RPMM')]
+        self.sim_time = SimTimeMapping(sim_sync, 1 / hz)
+        self.records = queue.Queue(maxsize=QUEUE_SECONDS * hz)
+        self.metrics = IngestMetrics()
+        # the live values need the analysis' wavelet, imported once connecting instead of when the GUI starts
+        from live_load import LiveLoad
+        self.live = LiveLoad(fields, hz)
+
+    def setup_thread(self) -> None:
+        """
+        As the name might suggest, this is the function that starts in a different thread
+        and starts taking records and writing them
+        To sync the data with the current simulator time it waits for the first read of the SQL table
+        (for FIRST_READ_TIMEOUT seconds at most, then the records count from 0 until there is one)
+        :return:
+        """
+        if self.sim_sync is not None and not self.sim_sync.first_read.wait(FIRST_READ_TIMEOUT):
+            print(f'--- no sim_time after {FIRST_READ_TIMEOUT} seconds, {self.file_name} counts from 0 until '
+                  f'it is read ---')
+        self.starting_time = datetime.datetime.now()
+        print(f'---=== started inserting messages to {self.file_name} at {self.starting_time} ===---')
+        self.metrics.start()
+        self.paused = False
+        self.write_csv(self.queue_gen())
+        print(f'---=== ingest {self.file_name}: {self.metrics.summary()} | '
+              f'average {self.metrics.average():.1f} KB/s ===---')
+
+    def receive(self, records: list, received_bytes: int) -> None:
+        """
+        Called from the event loop for every chunk the tracker sends, stamps every record with its sim_time
+        (mapped from the sensor's clock, see SimTimeSync)
+        and puts it in the queue for the writer, if the queue is full the record is dropped and counted
+        instead of blocking the connection
+        :param records: list: the values of every record in the chunk
+        :param received_bytes: int: total bytes received from the tracker
+        :return:
+        """
+        self.metrics.bytes_received = received_bytes
+        if self.paused:
+            return
+        for values, sim_time in zip(records, self.sim_time.stamp(records, self.time_index)):
+            values.append(sim_time)
+        self.live.receive(records)
+        for values in records:
+            try:
+                self.records.put_nowait((time.monotonic(), values))
+            except queue.Full:
+                self.metrics.dropped += 1
+            else:
+                self.metrics.queued(self.records.qsize())
+
+    def stop(self) -> None:
+        """
+        Stops taking records and tells the writer the recording is over
+        :return:
+        """
+        self.paused = True
+        self.records.put(None)
+
+    def queue_gen(self) -> list:
+        """
+        This is a generator function that yields the records from the queue until the recording is over
+        :return: list: the record's values
+        """
+        while True:
+            record = self.records.get()
+            if record is None:
+                return
+            self.metrics.dequeued(record[0])
+            yield record[1]
+
+    def valid(self, values: list) -> bool:
+        """
+        :param values: list: the record's values
+        :return: bool: whether the record has gaze and pupils up to 6 mm
+        """
+        try:
+            gaze, lpmm, rpmm = [float(values[i]) for i in self.valid_indexes]
+        except ValueError:
+            return False
+        return gaze != 0 and lpmm <= 6 and rpmm <= 6
+
+    def write_csv(self, generator) -> None:
+        """
+        The function that iterates over the full messages and writes the valid ones to the log (CSV or binary)
+        in segments of segment_seconds, merged into one log once the recording is over
+        :param generator: generator function
+        :return:
+        """
+        with stage(self.file_name, 'record') as span:
+            writer = SegmentWriter(f'{self.directory}/{self.file_name}', self.fields, self.log_format,
+                                   self.segment_seconds * self.hz)
+
+            for values in generator:
+                if self.valid(values):
+                    writer.writerow(values)
+
+            writer.close()
+            span.update(rows=writer.rows, received=self.metrics.received, dropped=self.metrics.dropped,
+                        late=self.metrics.late, max_depth=self.metrics.max_depth,
+                        average_kb_per_second=round(self.metrics.average(), 1))
+        print(f'---=== file {self.file_name} saved, dataframe size: {writer.rows} ===---')
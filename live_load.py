@@ -0,0 +1,255 @@
+import time
+from collections import deque
+import numpy as np
+from numpy import nan
+
+from cleaning_data import is_blink
+from cognitive_load import WAVELET, calc_distance, ica_rate
+
+# seconds the live values are calculated over, the same as the analysis after saving
+PUPIL_SECONDS = 3
+BLINK_SECONDS = 60
+ICA_SECONDS = 5
+BASELINE_SECONDS = 180
+
+
+class RingBuffer:
+    def __init__(self, size: int):
+        """
+        The last size values with their sum and count (NaN is left out of both), every value in O(1)
+        :param size: int
+        """
+        self.values = np.full(size, nan)
+        self.position = 0
+        self.total = 0.0
+        self.count = 0
+        self.added = 0
+
+    def add(self, value: float) -> None:
+        old = self.values[self.position]
+        if old == old:
+            self.total -= old
+            self.count -= 1
+        if value == value:
+            self.total += value
+            self.count += 1
+        self.values[self.position] = value
+        self.position = (self.position + 1) % len(self.values)
+        self.added += 1
+        if self.position == 0:
+            # the running sum is recalculated once a lap so rounding errors don't add up
+            self.total = float(np.nansum(self.values))
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else nan
+
+    def last(self, n: int) -> np.ndarray:
+        """
+        :param n: int
+        :return: numpy array: the last n values, oldest first
+        """
+        return np.roll(self.values, -self.position)[-n:]
+
+
+class LiveLoad:
+    def __init__(self, fields: list, hz: int):
+        """
+        The cognitive load values calculated while recording, from the records as they come
+        Every record updates ring buffers (3 seconds of pupil size, 5 seconds of pupil size for ICA) and the deque
+        of the last minute's blinks, the values are published after every chunk
+        Blinks are found like in the cleaning, a break shorter than is_blink's limit is a blink at the time it
+        started, the pupil size isn't bridged over blinks so it's left out of the windows while both pupils are
+        invalid
+        :param fields: list: variable names in the order of the records (sim_time last)
+        :param hz: int
+        """
+        self.hz = hz
+        self.index = {field: i for i, field in enumerate(fields)}
+
+        self.pupils = [RingBuffer(PUPIL_SECONDS * hz), RingBuffer(PUPIL_SECONDS * hz)]
+        # ICA needs the wavelet's filter length before the window as well
+        self.ica_rows = ICA_SECONDS * hz + WAVELET.dec_len + 4
+        self.ica_pupils = [RingBuffer(self.ica_rows), RingBuffer(self.ica_rows)]
+        self.minimums = [nan, nan]
+        self.starting_time = None
+
+        self.blinks = deque()
+        self.invalid_rows = 0
+        self.invalid_start = None
+        self.disparity = nan
+        self.sim_time = nan
+
+        # the published values, replaced as a whole so they can be read from any thread
+        self.values = {}
+        self.latency = 0.0
+
+    def add(self, values: list) -> None:
+        """
+        Updates the windows with one record
+        :param values: list: the record's values (strings or numbers)
+        :return:
+        """
+        get = self.index
+        sim_time = float(values[-1])
+        if self.starting_time is None:
+            self.starting_time = sim_time
+        self.sim_time = sim_time
+
+        # blink detector, a row where both pupils are invalid starts or continues a break
+        if float(values[get['LPMMV']]) == 1 or float(values[get['RPMMV']]) == 1:
+            if self.invalid_rows and is_blink(self.invalid_rows, self.hz):
+                self.blinks.append(self.invalid_start)
+            self.invalid_rows = 0
+            pupils = float(values[get['LPMM']]), float(values[get['RPMM']])
+        else:
+            if self.invalid_rows == 0:
+                self.invalid_start = sim_time
+            self.invalid_rows += 1
+            pupils = nan, nan
+        while self.blinks and self.blinks[0] < sim_time - BLINK_SECONDS:
+            self.blinks.popleft()
+
+        for pupil, window, ica_window in zip(pupils, self.pupils, self.ica_pupils):
+            window.add(pupil)
+            # the wavelet can't have gaps, a break holds the last size
+            ica_window.add(pupil if pupil == pupil else ica_window.values[ica_window.position - 1])
+
+        if float(values[get['LPOGV']]) == 1 and float(values[get['RPOGV']]) == 1:
+            self.disparity = calc_distance(float(values[get['LPOGX']]), float(values[get['RPOGX']]),
+                                           float(values[get['LPOGY']]), float(values[get['RPOGY']]))
+        else:
+            self.disparity = nan
+
+    def ica(self, window: RingBuffer) -> float:
+        """
+        Peaks per second over the last 5 seconds, the analysis' ICA (ica_rate) of the rows received so far as if
+        the recording was one group: the coefficients are paired from the first record and the window starts on
+        the same pairing. A coefficient covers two rows and needs the second of them, so after the first row of
+        a pair the value is the previous row's
+        :param window: RingBuffer
+        :return: float
+        """
+        if window.added < ICA_SECONDS * self.hz:
+            return nan
+        rows = min(window.added, self.ica_rows)
+        rows -= (window.added - rows) % 2
+        rates = ica_rate(window.last(rows), self.hz)
+        return rates[-1] if window.added % 2 == 0 else rates[-2]
+
+    def publish(self) -> None:
+        """
+        Calculates the current values, the pupil sizes are divided by their minimum of the first 3 minutes
+        :return:
+        """
+        pupils = []
+        for i, window in enumerate(self.pupils):
+            size = window.mean() if window.added >= len(window.values) else nan
+            if size == size and self.sim_time - self.starting_time <= BASELINE_SECONDS:
+                self.minimums[i] = size if self.minimums[i] != self.minimums[i] else min(self.minimums[i], size)
+            pupils.append(size / self.minimums[i])
+
+        self.values = {'sim_time': self.sim_time, 'disparity': self.disparity, 'bkmin': len(self.blinks),
+                       'lpp': pupils[0], 'rpp': pupils[1],
+                       'l_ica': self.ica(self.ica_pupils[0]), 'r_ica': self.ica(self.ica_pupils[1])}
+
+    def receive(self, records: list) -> None:
+        """
+        Called for every chunk of records, the latency is the time from receiving the chunk to publishing
+        :param records: list: the values of every record in the chunk
+        :return:
+        """
+        if not records:
+            return
+        starting_time = time.perf_counter()
+        for values in records:
+            try:
+                self.add(values)
+            except ValueError:
+                # a record with an empty value is left out, like the rows the writer doesn't write
+                continue
+        self.publish()
+        self.latency = time.perf_counter() - starting_time
+
+    def summary(self) -> str:
+        """
+        :return: string: the current values in one line
+        """
+        values = self.values
+        if not values:
+            return ''
+        return f'disparity {values["disparity"]:.3f} | bkmin {values["bkmin"]} | ' \
+               f'lpp {values["lpp"]:.2f} rpp {values["rpp"]:.2f} | ica {values["l_ica"]:.1f} {values["r_ica"]:.1f}'
+
+
+def benchmark(fields: list, hz: int, seconds: int = 600, chunk: int = 1) -> float:
+    """
+    Feeds synthetic records in chunks and measures the latency, it should stay under 50 ms
+    :param fields: list: variable names (sim_time last)
+    :param hz: int
+    :param seconds: int: length of the synthetic recording
+    :param chunk: int: records per chunk
+    :return: float: largest latency in seconds
+    """
+    rng = np.random.default_rng(0)
+    rows = seconds * hz
+    data = rng.uniform(0.2, 0.8, (rows, len(fields)))
+    for field in fields:
+        if field.endswith('V'):
+            data[:, fields.index(field)] = rng.random(rows) > 0.02
+        elif field.endswith('MM'):
+            data[:, fields.index(field)] = rng.normal(3.5, 0.2, rows)
+    data[:, -1] = np.arange(rows) / hz
+
+    live = LiveLoad(fields, hz)
+    latencies = []
+    for start in range(0, rows, chunk):
+        live.receive(data[start:start + chunk].tolist())
+        latencies.append(live.latency)
+
+    latency = max(latencies)
+    print(f'--- {rows} records in chunks of {chunk}: mean latency {np.mean(latencies) * 1000:.2f} ms, '
+          f'max {latency * 1000:.2f} ms ({"OK" if latency < 0.05 else "TOO SLOW"}) ---')
+    print(f'--- {live.summary()} ---')
+    return latency
+
+
+def check_ica(hz: int, seconds: int = 120, noise: float = 0.15, seed: int = 0) -> bool:
+    """
+    Feeds an all-valid stream record by record and checks the live ICA is the analysis' ICA of the same rows
+    :param hz: int
+    :param seconds: int: length of the stream
+    :param noise: float: standard deviation of the pupil size
+    :param seed: int
+    :return: bool: whether every live value matched
+    """
+    fields = ['LPOGX', 'LPOGY', 'LPOGV', 'RPOGX', 'RPOGY', 'RPOGV', 'LPMM', 'LPMMV', 'RPMM', 'RPMMV', 'sim_time']
+    rng = np.random.default_rng(seed)
+    rows = seconds * hz
+    data = np.ones((rows, len(fields)))
+    data[:, fields.index('LPMM')] = rng.normal(3.5, noise, rows)
+    data[:, fields.index('RPMM')] = rng.normal(3.6, noise, rows)
+    data[:, -1] = np.arange(rows) / hz
+
+    expected = {'l_ica': ica_rate(data[:, fields.index('LPMM')], hz),
+                'r_ica': ica_rate(data[:, fields.index('RPMM')], hz)}
+    live = LiveLoad(fields, hz)
+    mismatches = 0
+    for i in range(rows):
+        live.receive([data[i].tolist()])
+        # the value of the first row of a pair is the previous row's
+        row = i if i % 2 else i - 1
+        for column, rates in expected.items():
+            value = rates[row] if row >= 0 else nan
+            if not (live.values[column] == value or value != value and live.values[column] != live.values[column]):
+                mismatches += 1
+
+    print(f'--- live ICA at {hz} hz: {mismatches} of {rows * 2} values differ from the analysis '
+          f'({"OK" if mismatches == 0 else "WRONG"}) ---')
+    return mismatches == 0
+
+
+if __name__ == '__main__':
+    # latency at 150 hz with the variables from the commands csv
+    import pandas as pd
+    benchmark(list(pd.read_csv('configs/commands.csv')['variable']) + ['sim_time'], 150)
+    check_ica(150)
@@ -0,0 +1,280 @@
+import os
+import csv
+import shutil
+import struct
+import numpy as np
+import pandas as pd
+
+# logs are either CSV files or binary .npy files (a structured array with a field per column)
+# that load without parsing any text, every stage saves its results in the format it was given
+LOG_FORMATS = ['csv', 'npy']
+
+
+def log_dtype(column: str) -> str:
+    """
+    Counters and validity flags are whole numbers, everything else the sensor sends is a float
+    :param column: string
+    :return: string: numpy type of the column
+    """
+    return '<i8' if column == 'CNT' or column.endswith('V') else '<f8'
+
+
+def npy_header(dtype: np.dtype, rows: int) -> bytes:
+    """
+    The .npy header of a structured array, always padded to the same size so it can be rewritten
+    once the number of rows is known
+    :param dtype: numpy dtype
+    :param rows: int
+    :return: bytes
+    """
+    def header_text(n):
+        return "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(dtype), n)
+
+    # magic string, version and header length are 10 bytes, the header itself ends with a new line
+    size = -(-(len(header_text(10 ** 20)) + 11) // 64) * 64
+    text = header_text(rows).ljust(size - 11) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(text)) + text.encode('latin1')
+
+
+def find_log(path: str) -> str:
+    """
+    Checks which format a log was saved in, binary comes first if both exist
+    :param path: string: file path without the extension
+    :return: string: format of the existing file, None if there's no such log
+    """
+    for log_format in reversed(LOG_FORMATS):
+        if os.path.exists(f'{path}.{log_format}'):
+            return log_format
+    return None
+
+
+def load_log(path: str) -> pd.DataFrame:
+    """
+    The one loader for every log, CSV or binary
+    The number of rows in a binary log is taken from its size so a recording that was never closed still loads
+    :param path: string: file path without the extension
+    :return: dataframe
+    """
+    log_format = find_log(path)
+    if log_format is None:
+        raise FileNotFoundError(f'no log named {path}.csv or {path}.npy')
+    if log_format == 'csv':
+        return pd.read_csv(f'{path}.csv')
+
+    with open(f'{path}.npy', 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            _, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            _, _, dtype = np.lib.format.read_array_header_2_0(f)
+        rows = (os.fstat(f.fileno()).st_size - f.tell()) // dtype.itemsize
+        data = np.fromfile(f, dtype=dtype, count=rows)
+    return pd.DataFrame(data)
+
+
+def save_log(df: pd.DataFrame, path: str, log_format: str) -> None:
+    """
+    Saves a dataframe (without its index) in the wanted format
+    :param df: dataframe
+    :param path: string: file path without the extension
+    :param log_format: string: csv/npy
+    :return:
+    """
+    if log_format == 'npy':
+        np.save(f'{path}.npy', df.to_records(index=False), allow_pickle=False)
+    else:
+        df.to_csv(f'{path}.csv', index=False)
+
+
+def export_csv(path: str) -> None:
+    """
+    Writes a CSV copy of a binary log next to it
+    :param path: string: file path without the extension
+    :return:
+    """
+    load_log(path).to_csv(f'{path}.csv', index=False)
+    print(f'--- exported {path}.csv ---')
+
+
+def sync_close(file) -> None:
+    """
+    Makes sure everything written is on the disk before closing the file
+    :param file: file object
+    :return:
+    """
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+
+
+class LogWriter:
+    def __init__(self, path: str, columns: list):
+        """
+        Appends rows to a binary log as they come, used like a csv writer
+        :param path: string: file path without the extension
+        :param columns: list: column names
+        """
+        self.dtype = np.dtype([(column, log_dtype(column)) for column in columns])
+        self.converters = [int if log_dtype(column) == '<i8' else float for column in columns]
+        self.row = struct.Struct('<' + ''.join('q' if c is int else 'd' for c in self.converters))
+        self.rows = 0
+        self.file = open(f'{path}.npy', 'wb')
+        self.file.write(npy_header(self.dtype, 0))
+
+    def writerow(self, values) -> None:
+        """
+        :param values: iterable: a value (or its string) for every column
+        :return:
+        """
+        self.file.write(self.row.pack(*[convert(float(value)) for convert, value in zip(self.converters, values)]))
+        self.rows += 1
+
+    def close(self) -> None:
+        """
+        Writes the final number of rows in the header and closes the file
+        :return:
+        """
+        self.file.seek(0)
+        self.file.write(npy_header(self.dtype, self.rows))
+        sync_close(self.file)
+
+
+def segment_rows(segment: str) -> tuple:
+    """
+    The complete rows of a segment, a segment that was being written during a crash can end with part of a row
+    :param segment: string: segment file path
+    :return: tuple: (header size in bytes, number of complete rows, bytes of the complete rows)
+    """
+    with open(segment, 'rb') as f:
+        if segment.endswith('.npy'):
+            np.lib.format.read_magic(f)
+            _, _, dtype = np.lib.format.read_array_header_1_0(f)
+            header = f.tell()
+            rows = (os.fstat(f.fileno()).st_size - header) // dtype.itemsize
+            return header, rows, rows * dtype.itemsize
+        data = f.read()
+    header = data.find(b'\n') + 1
+    end = data.rfind(b'\n') + 1
+    return header, data.count(b'\n', header, end), end - header
+
+
+class SegmentWriter:
+    def __init__(self, path: str, columns: list, log_format: str, segment_rows_count: int):
+        """
+        Writes a recording in segments of a fixed number of rows, every finished segment is synced to the disk so
+        a crash loses at most the segment being written, the rows are numbered (CNT) as they're written
+        If segments of the same recording already exist, writing resumes after them
+        :param path: string: log file path without the extension, segments are written to a folder next to it
+        :param columns: list: column names (without CNT)
+        :param log_format: string: csv/npy
+        :param segment_rows_count: int: rows per segment
+        """
+        self.path = path
+        self.directory = f'{path}_segments'
+        self.columns = ['CNT'] + list(columns)
+        self.log_format = log_format
+        self.segment_rows_count = segment_rows_count
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self.segments = len(os.listdir(self.directory))
+        self.rows = sum(segment_rows(segment)[1] for segment in list_segments(path))
+        self.file = self.writer = None
+        self.segment_rows = 0
+
+    def _next_segment(self) -> None:
+        """
+        Closes the current segment and opens the next one
+        :return:
+        """
+        self._close_segment()
+        segment = f'{self.directory}/{self.segments:06d}'
+        if self.log_format == 'npy':
+            self.file = self.writer = LogWriter(segment, self.columns)
+        else:
+            self.file = open(f'{segment}.csv', 'w', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.columns)
+        self.segments += 1
+        self.segment_rows = 0
+
+    def _close_segment(self) -> None:
+        if self.file is None:
+            return
+        if self.log_format == 'npy':
+            self.file.close()
+        else:
+            sync_close(self.file)
+        self.file = None
+
+    def writerow(self, values) -> None:
+        """
+        :param values: list: a value (or its string) for every column but CNT
+        :return:
+        """
+        if self.file is None or self.segment_rows == self.segment_rows_count:
+            self._next_segment()
+        self.writer.writerow([self.rows] + values)
+        self.rows += 1
+        self.segment_rows += 1
+
+    def close(self) -> None:
+        """
+        Closes the last segment and merges all the segments into the log
+        :return:
+        """
+        if self.segments == 0:
+            # the log of a recording without valid rows still has its columns
+            self._next_segment()
+        self._close_segment()
+        merge_segments(self.path)
+
+
+def list_segments(path: str) -> list:
+    """
+    :param path: string: log file path without the extension
+    :return: list: the segment file paths in the order they were written
+    """
+    directory = f'{path}_segments'
+    # a crash right after a segment was created can leave it empty
+    return [f'{directory}/{segment}' for segment in sorted(os.listdir(directory))
+            if os.path.getsize(f'{directory}/{segment}')]
+
+
+def merge_segments(path: str) -> None:
+    """
+    Joins the segments of a recording into one log without parsing them, only their headers are skipped
+    (also how a recording that crashed is recovered), the segments are deleted after the log is synced
+    :param path: string: log file path without the extension
+    :return:
+    """
+    segments = list_segments(path)
+    if not segments:
+        shutil.rmtree(f'{path}_segments')
+        return
+    log_format = segments[0].rsplit('.', 1)[1]
+    parts = [segment_rows(segment) for segment in segments]
+
+    with open(f'{path}.{log_format}', 'wb') as log:
+        with open(segments[0], 'rb') as f:
+            if log_format == 'npy':
+                np.lib.format.read_magic(f)
+                _, _, dtype = np.lib.format.read_array_header_1_0(f)
+                log.write(npy_header(dtype, sum(rows for _, rows, _ in parts)))
+            else:
+                log.write(f.read(parts[0][0]))
+        for segment, (header, _, size) in zip(segments, parts):
+            with open(segment, 'rb') as f:
+                f.seek(header)
+                log.write(f.read(size))
+        sync_close(log)
+    shutil.rmtree(f'{path}_segments')
+
+
+if __name__ == '__main__':
+    # the explicit CSV export of a binary log, or the recovery of a recording that crashed from its segments
+    log_path = input('log path without extension (e.g. csv logs/name)\n> ')
+    if os.path.exists(f'{log_path}_segments'):
+        merge_segments(log_path)
+    else:
+        export_csv(log_path)
@@ -1,46 +1,51 @@
 import gui
 from cleaning_data import FileCleaner
+from log_files import find_log
+from gazepoint_client import GazepointClient, TrackerLoop, connect_all, ACK_TIMEOUT
+from ingest import Feeder, SEGMENT_SECONDS
+from sim_time_sync import SimTimeSync, SYNC_SECONDS, SIM_TABLE
+from run_report import PROFILE_VARIABLE
 import os
 import json
 import sys
-import datetime
-from PyQt5 import QtGui, QtWidgets
-from socket import socket, AF_INET, SOCK_STREAM
+from PyQt5 import QtCore, QtGui, QtWidgets
 import pandas as pd
 import threading
-import csv
+import multiprocessing
 import urllib
-from sqlalchemy import create_engine
 
 
-def sql_connection(db: str):
+def sql_url(db: str) -> str:
     """
-    Creates SQL connection
+    Creates the SQL Server URL
     :param db: string, database name
-    :return: SQL connection
+    :return: string: SQLAlchemy URL
     """
     conn_str = "DRIVER={SQL Server Native Client 16.0};SERVER=DanielaSRV;DATABASE=" + db + \
                ";UID=dani;PWD=ela;MARS_Connection=Yes;"
     params = urllib.parse.quote_plus(conn_str)
-    engine = create_engine("mssql+pyodbc:///?odbc_connect=%s" % params)
-    connection = engine.connect()
-    return connection
+    return "mssql+pyodbc:///?odbc_connect=%s" % params
 
 
 # reads the config file
 with open('configs/config.json', 'r') as f:
     config = json.load(f)
 
-HOST = config['host_ip']
-PORT = config['port']
-ADDRESS = (HOST, PORT)
+# every tracker records to its own file, a single tracker can be set with host_ip and port
+trackers = config.get('trackers', [{'host_ip': config.get('host_ip'), 'port': config.get('port')}])
+ack_timeout = config.get('ack_timeout', ACK_TIMEOUT)
 csv_name = config['commands']
-db_name = config['db_name']
+# any SQLAlchemy URL can replace the SQL Server database (e.g. sqlite:///sim.db)
+db_url = config.get('db_url') or sql_url(config['db_name'])
+sync_seconds = config.get('sync_seconds', SYNC_SECONDS)
+sim_table = config.get('sim_table', SIM_TABLE)
 hz = config['hz']
-tick = 1 / hz
-
-# connects to database
-conn = sql_connection(db_name)
+workers = config.get('workers', 1)
+log_format = config.get('log_format', 'csv')
+segment_seconds = config.get('segment_seconds', SEGMENT_SECONDS)
+# profiles every stage (cprofile/pyinstrument), through the environment so the worker processes profile as well
+if config.get('profile'):
+    os.environ.setdefault(PROFILE_VARIABLE, config['profile'])
 
 # gets the API commands from csv
 api_csv = pd.read_csv(f'configs/{csv_name}.csv')
@@ -48,16 +53,11 @@ command_list = [x for x in api_csv['command'] if x != '-']
 
 # makes a dictionary out of the variables from excel
 var_dict = {}
-closing_line = []
 
 for var in api_csv['variable']:
     var_dict[f'{var}'] = 0
-    closing_line.append(0)
 var_dict['sim_time'] = 0
 
-# global socket
-s = socket(AF_INET, SOCK_STREAM)
-
 # creates folder if needed
 if not os.path.exists("csv logs"):
     os.makedirs('csv logs')
@@ -70,8 +70,10 @@ class Gui(QtWidgets.QMainWindow, gui.GazepointUI):
         """
         super(Gui, self).__init__()
         self.setup_ui(self)
+        self.size_status(self, len(trackers))
 
-        self.labelHost.setText(f'{HOST}:{PORT}')
+        self.labelHost.setText(', '.join(f'{tracker["host_ip"]}:{tracker["port"]}' for tracker in trackers))
+        self.tracker_loop = TrackerLoop()
 
         self.buttonSave.setDisabled(True)
         self.buttonFeed.setDisabled(True)
@@ -96,11 +98,15 @@ class Gui(QtWidgets.QMainWindow, gui.GazepointUI):
         # cheat code for testing
         if self.name == 'caitvi':
             print('--- cheat code activated :) ---')
-            conn.close()
             app.quit()
-            FileCleaner(input('file_name\n> '), int(input('hz\n> ')))
+            FileCleaner(input('file_name\n> '), int(input('hz\n> ')), workers)
+            return
 
-        if self.name == '' or os.path.exists(f'csv logs/{self.name}.csv') or not name_check.isalnum():
+        self.file_names = [self.name] if len(trackers) == 1 else \
+            [f'{self.name}_{i + 1}' for i in range(len(trackers))]
+
+        if self.name == '' or any(find_log(f'csv logs/{name}') for name in self.file_names) or \
+                not name_check.isalnum():
             self.labelFileExists.setText('Choose a different name')
             self.labelFileExists.setstylesheet("font-weight: bold; color: red; font-size: 13pt")
         else:
@@ -108,155 +114,123 @@ class Gui(QtWidgets.QMainWindow, gui.GazepointUI):
             self.lineResultName.setDisabled(True)
             self.buttonSet.setDisabled(True)
             self.buttonAck.setDisabled(False)
-            self.labelFileExists.setText(f'Name set: {self.name}.csv')
+            # the segments of a recording that crashed are kept and the new segments are added after them
+            resumed = any(os.path.exists(f'csv logs/{name}_segments') for name in self.file_names)
+            self.labelFileExists.setText(f'{"Resuming" if resumed else "Name set"}: {self.name}.{log_format}')
             self.labelFileExists.setstyleSheet('font-weight: bold; color: green; font-size: 13pt')
         return
 
     def _open_socket(self) -> None:
         """
-        Makes sure the TCP socket can connect and sends the wanted API commands
-        Also instantiating the class responsible for the thread passing the data
+        Connects to every tracker and sends the wanted API commands without blocking the GUI,
+        Also instantiating the classes responsible for the threads writing the data
         calls for the next function automatically
         :return:
         """
-        try:
-            s.connect(ADDRESS)
-        except ConnectionRefusedError:
-            self.labelFileExists.setText('Failed: open Gazepoint Control')
-            self.labelFileExists.setStyleSheet('font-weight: bold; color: red; font-size: i5pt')
-            return
+        self.buttonAck.setDisabled(True)
+        fields = [key for key in var_dict.keys() if key != 'sim_time']
+        self.clients = [GazepointClient(tracker['host_ip'], tracker['port'], fields) for tracker in trackers]
+        self.sim_sync = SimTimeSync(db_url, sync_seconds, sim_table)
+        self.feeders = [Feeder(name, True, self.sim_sync, list(var_dict.keys()), hz, log_format, segment_seconds)
+                        for name in self.file_names]
 
-        self.feeder = Feeder(self.name, True)
+        self.connecting = self.tracker_loop.submit(connect_all(self.clients, command_list, ack_timeout))
+        print('--- connecting ---')
 
-        for command in command_list:
-            s.send(str.encode(f'<SET ID="{command}" STATE="1" />\r\n'))
-        s.send(str.encode('<SET ID="ENABLE_SEND_DATA" STATE="1" />\r\n'))
-        print('--- socket opened ---')
-        self._acknowledge(False)
+        # checks if the trackers acknowledged the commands
+        self.ack_timer = QtCore.QTimer()
+        self.ack_timer.timeout.connect(self._acknowledge)
+        self.ack_timer.start(100)
 
-    def _acknowledge(self, ack: bool) -> None:
+    def _acknowledge(self) -> None:
         """
-        Makes sure all the API commands were sent and acknowledged properly
-        :param ack: bool: are the commands acknowledged?
+        Makes sure all the API commands were sent and acknowledged properly by every tracker
+        (or that they timed out, then connecting can be tried again)
         :return:
         """
-        ack_counter = 0
-        while not ack:
-            data = bytes.decode(s.recv(1024))
-            if data.find('ACK') == 1:
-                ack_counter += data.count('ACK')
-                print(f"--- acknowledged {ack_counter} out of {len(command_list) + 1} commands ---")
-            if ack_counter == len(command_list) + 1:
-                self.buttonAck.setDisabled(True)
-                self.buttonFeed.setDisabled(False)
-                self.imgAck.setPixmap(QtGui.QPixmap("icons/v.png"))
-                ack = True
+        if not self.connecting.done():
+            return
+        self.ack_timer.stop()
+
+        failed = [f'{client.host}:{client.port}' for client, result in zip(self.clients, self.connecting.result())
+                  if result is not None]
+        if failed:
+            print(f'--- failed connecting to {", ".join(failed)} ---')
+            for client in self.clients:
+                self.tracker_loop.call(client.close)
+            self.labelFileExists.setText('Failed: open Gazepoint Control')
+            self.labelFileExists.setStyleSheet('font-weight: bold; color: red; font-size: 13pt')
+            self.buttonAck.setDisabled(False)
+            return
+
+        print(f"--- acknowledged {len(command_list) + 1} commands by {len(self.clients)} tracker(s) ---")
+        self.buttonFeed.setDisabled(False)
+        self.imgAck.setPixmap(QtGui.QPixmap("icons/v.png"))
 
     def _call_data_feed(self) -> None:
         """
-        Calls for a thread of the data feeder setup function
+        Calls for a thread of the data feeder setup function for every tracker
         :return:
         """
         self.buttonSave.setDisabled(False)
         self.buttonFeed.setDisabled(True)
 
-        self.feeder.paused = False
-        threading.Thread(target=self.feeder.setup_thread).start()
-
-    def _save_exit(self) -> None:
-        """
-        Reads the CSV file written by the write_csv function and removes any invalid
-        rows, then exits the GUI and starts the cleaning, analyzing and visualizing processes
-        :return:
-        """
-        self.feeder.paused = True
-        ui.hide()
-        convert_df = pd.read_csv(f'csv logs/{self.name}.csv')
-        convert_df = convert_df[convert_df.iloc[:, 1] != 0]
-        convert_df = convert_df[(convert_df['LPMM'] <= 6) & (convert_df['RPMM'] <= 6)]
-        convert_df = convert_df.reset_index(drop=True)
-        convert_df.to_csv(f'csv logs/{self.name}.csv', index_label='CNT')
-        print(f'---=== file saved, dataframe size: {len(convert_df.index)} ===---')
-        conn.close()
-        app.quit()
-        # start cleaning
-        FileCleaner(self.name, hz)
-
+        self.sim_sync.start()
+        self.feed_threads = []
+        for client, feeder in zip(self.clients, self.feeders):
+            self.tracker_loop.call(client.stream_to, feeder.receive)
+            self.feed_threads.append(threading.Thread(target=feeder.setup_thread))
+            self.feed_threads[-1].start()
 
-class Feeder:
-    def __init__(self, file_name: str, paused: bool):
-        """
-        This class recieves the data and writes it to a file on a different thread so the GUI
-        can continue being responsive
-        :param file_name: string
-        :param paused: bool
-        """
-        self.file_name = file_name
-        self.paused = paused
+        # shows the ingest counters every second
+        self.metrics_timer = QtCore.QTimer()
+        self.metrics_timer.timeout.connect(self._show_metrics)
+        self.metrics_timer.start(1000)
 
-    def setup_thread(self) -> None:
+    def _show_metrics(self) -> None:
         """
-        As the name might suggest, this is the function that starts in a different thread
-        and calls both the generator and writing functions
-        To sync the data with the current simulator time we take the last sim_time from the SQL table
+        Shows the ingest counters (queue depth, dropped and late records, bytes per second) and the live
+        cognitive load values under the buttons, a tracker that lost its connection is shown in red
         :return:
         """
-        time_query = f"""
-        SELECT TOP (1) sim_time AS st
-        FROM dis.inGameTime
-        ORDER BY WorldTime DESC
-        """
-        time_result = pd.read_sql_query(time_query, conn)
-        if not time_result.empty:
-            var_dict['sim_time'] = time_result['st'][0]
-
-        self.write_csv(self.decoder_gen())
+        lost = [client.lost is not None for client in self.clients]
+        self.labelIngest.setText('\n'.join(
+            f'{"LOST CONNECTION | " if is_lost else ""}{feeder.metrics.summary()}'
+            for is_lost, feeder in zip(lost, self.feeders)))
+        self.labelIngest.setStyleSheet('font-weight: bold; color: red' if any(lost) else '')
+        self.labelLoad.setText('\n'.join(feeder.live.summary() for feeder in self.feeders))
 
-    def decoder_gen(self, buffer='') -> str:
-        """
-        This is a generator function that listens to the TCP stream and yields full messages
-        :param buffer: string
-        :return: string: a full message
-        """
-        self.starting_time = datetime.datetime.now()
-        print(f'---=== started inserting messages at {self.starting_time} ===---')
-        while not self.paused:
-            data = bytes.decode(s.recv(1024))
-            buffer += data
-            while '\n' in buffer:
-                lines = buffer.split('\n')
-                buffer = lines.pop()
-                for line in lines:
-                    yield line
-
-    def write_csv(self, generator) -> None:
+    def _save_exit(self) -> None:
         """
-        The function that iterates over the full messages and writes a roe to the CSV
-        :param generator: generator function
+        Waits for the write_csv functions to merge the segments into the logs (invalid rows are
+        already left out), then exits the GUI and starts the cleaning, analyzing and visualizing processes
         :return:
         """
-        file = open(f'csv logs/{self.file_name}.csv', 'w+', newline='')
-        writer = csv.writer(file)
-        writer.writerow(var_dict.keys())
-
-        for message in generator:
-            string_list = message.split(' ')[1:-1]
-
-            for string in string_list:
-                key = string.split("=")[0]
-                if key in var_dict.keys():
-                    var_dict[f'{key}'] = string.split('\"')[1]
-
-            var_dict['sim_time'] += tick
-            writer.writerow(var_dict.values())
-
-        writer.writerow(closing_line)
-        file.close()
-        print(f'---=== time elapsed inserting {datetime.datetime.now() - self.starting_time} ===---')
-
+        self.metrics_timer.stop()
+        ui.hide()
+        for client, feeder in zip(self.clients, self.feeders):
+            self.tracker_loop.call(feeder.stop)
+            self.tracker_loop.call(client.close)
+        for thread in self.feed_threads:
+            thread.join()
+        self.tracker_loop.stop()
+        self.sim_sync.stop()
 
-# start GUI
-app = QtWidgets.QApplication(sys.argv)
-ui = Gui()
-ui.show()
-app.exec_()
+        app.quit()
+        # start cleaning
+        for name in self.file_names:
+            FileCleaner(name, hz, workers)
+
+
+if __name__ == '__main__':
+    # the analysis worker processes import this file as well, they shouldn't start a GUI (or the EXE)
+    multiprocessing.freeze_support()
+
+    # start GUI
+    app = QtWidgets.QApplication(sys.argv)
+    ui = Gui()
+    ui.show()
+    # startup_time.py launches the GUI with --startup to time it, it quits once the window is shown
+    if '--startup' in sys.argv:
+        QtCore.QTimer.singleShot(0, app.quit)
+    app.exec_()
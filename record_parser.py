@@ -0,0 +1,134 @@
+import re
+import time
+
+# a full record line and the KEY="value" attributes inside it
+REC_START = b'<REC '
+ATTRIBUTE = re.compile(rb'(\w+)="([^"]*)"')
+
+
+class RecordParser:
+    def __init__(self, sock, fields: list, size: int = 65536):
+        """
+        Parses the Gazepoint stream straight from the socket into a preallocated buffer,
+        only the unfinished line at the end of every chunk is moved to the start of the buffer
+        :param sock: socket (or anything with recv_into), None if the buffer is filled by an asyncio protocol
+        :param fields: list: variable names in the order they're written
+        :param size: int: buffer size in bytes
+        """
+        self.sock = sock
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.end = 0
+        self.received_bytes = 0
+        self.acks = 0
+        self.fields = {field.encode(): i for i, field in enumerate(fields)}
+        # variables that aren't sent in a record keep their last value
+        self.values = [0] * len(fields)
+
+    def read(self) -> list:
+        """
+        Receives the next chunk from the socket and parses every complete record in the buffer
+        :return: list: the values of every complete record
+        """
+        received = self.sock.recv_into(self.free_space())
+        if received == 0:
+            raise ConnectionError('Gazepoint closed the connection')
+        return self.received(received)
+
+    def free_space(self) -> memoryview:
+        """
+        :return: memoryview: the part of the buffer the next chunk is received into
+        """
+        if self.end == len(self.buffer):
+            # a line longer than the whole buffer isn't a record
+            self.end = 0
+        return self.view[self.end:]
+
+    def received(self, received: int) -> list:
+        """
+        Called after a chunk was received into the free space of the buffer
+        :param received: int: number of bytes received
+        :return: list: the values of every complete record
+        """
+        self.end += received
+        self.received_bytes += received
+        return self.parse()
+
+    def parse(self) -> list:
+        """
+        Parses the complete lines in the buffer, attributes are matched in place without slicing the line out
+        :return: list: the values of every complete record
+        """
+        records = []
+        start = 0
+        newline = self.buffer.find(b'\n', start, self.end)
+        while newline != -1:
+            line_start = self.buffer.find(b'<', start, newline)
+            if line_start != -1 and self.buffer.startswith(REC_START, line_start, newline):
+                for key, value in ATTRIBUTE.findall(self.buffer, line_start, newline):
+                    i = self.fields.get(key)
+                    if i is not None:
+                        self.values[i] = value.decode()
+                records.append(self.values.copy())
+            elif line_start != -1 and self.buffer.startswith(b'<ACK', line_start, newline):
+                self.acks += 1
+            start = newline + 1
+            newline = self.buffer.find(b'\n', start, self.end)
+
+        leftover = self.end - start
+        if start and leftover:
+            self.buffer[:leftover] = self.buffer[start:self.end]
+        self.end = leftover
+        return records
+
+
+class _ReplaySocket:
+    def __init__(self, data: bytes, chunk: int):
+        """
+        Hands out recorded bytes in chunks like a socket would, for the benchmark
+        :param data: bytes
+        :param chunk: int
+        """
+        self.data = memoryview(data)
+        self.position = 0
+        self.chunk = chunk
+
+    def recv_into(self, view: memoryview) -> int:
+        """
+        :param view: memoryview: where to write the chunk
+        :return: int: number of bytes written
+        """
+        size = min(self.chunk, len(view), len(self.data) - self.position)
+        view[:size] = self.data[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+def benchmark(fields: list, hz: int, records: int = 200000, chunk: int = 1024) -> float:
+    """
+    Parses synthetic records and compares the rate to the sensor rate, the parser should keep up with 10 times it
+    :param fields: list: variable names
+    :param hz: int: sensor rate
+    :param records: int: number of records to parse
+    :param chunk: int: bytes per recv
+    :return: float: records per second
+    """
+    line = '<REC ' + ' '.join(f'{field}="{0.123456 + i:.5f}"' for i, field in enumerate(fields)) + ' />\r\n'
+    sock = _ReplaySocket((line * records).encode(), chunk)
+    parser = RecordParser(sock, fields)
+
+    parsed = 0
+    starting_time = time.perf_counter()
+    while parsed < records:
+        parsed += len(parser.read())
+    rate = parsed / (time.perf_counter() - starting_time)
+
+    print(f'--- parsed {parsed} records of {len(fields)} fields: {rate:.0f} records/s, '
+          f'{rate / hz:.0f}x the sensor rate of {hz} hz ({"OK" if rate >= 10 * hz else "TOO SLOW"}) ---')
+    return rate
+
+
+if __name__ == '__main__':
+    # microbenchmark with the variables from the commands csv
+    import pandas as pd
+    benchmark(list(pd.read_csv('configs/commands.csv')['variable']), 150)
@@ -0,0 +1,257 @@
+from gazepoint_client import GazepointClient, TrackerLoop, connect_all
+from ingest import Feeder
+from log_files import load_log
+from synthetic_session import generate_session
+
+import os
+import re
+import time
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+# the SET commands the server answers and how often it sends the records that are due, in seconds
+SET_COMMAND = re.compile(rb'<SET ID="(\w+)" STATE="(\d)"')
+SEND_EVERY = 0.005
+# speeds the load test goes through (multiples of the sensor rate) and how long it stays at each one
+SPEEDS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+STEP_SECONDS = 5
+
+
+def record_lines(df: pd.DataFrame) -> list:
+    """
+    Turns a recording back into the REC lines Gazepoint sent, CNT and sim_time aren't sent by the sensor
+    :param df: dataframe
+    :return: list: encoded lines
+    """
+    fields = [column for column in df.columns if column not in ('CNT', 'sim_time')]
+    values = df[fields].to_numpy(dtype=float)
+    template = '<REC ' + ' '.join(f'{field}="%.5f"' for field in fields) + ' />\r\n'
+    return [(template % tuple(row)).encode() for row in values]
+
+
+class ReplayServer:
+    def __init__(self, lines: list, hz: int, speed: float = 1, jitter: float = 0, partial: bool = False,
+                 records: int = None, seed: int = 0):
+        """
+        A stand-in for Gazepoint Control that speaks the part of the Open Gaze API we use,
+        every SET command is acknowledged and once data is enabled the records are streamed (over and over)
+        :param lines: list: encoded REC lines
+        :param hz: int: sensor rate
+        :param speed: float: multiple of the sensor rate
+        :param jitter: float: largest random delay added before every send, in seconds
+        :param partial: bool: split every send at random places, so lines arrive in pieces
+        :param records: int: number of records to send, None to never stop (the connection stays open until the
+        client closes it)
+        :param seed: int
+        """
+        self.lines = lines
+        self.rate = hz * speed
+        self.jitter = jitter
+        self.partial = partial
+        self.records = records
+        self.rng = np.random.default_rng(seed)
+        self.sent = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        One connection, answers the commands while the records are streamed
+        :param reader: asyncio stream reader
+        :param writer: asyncio stream writer
+        :return:
+        """
+        enabled = asyncio.Event()
+        streaming = asyncio.ensure_future(self.stream(writer, enabled))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = SET_COMMAND.search(line)
+                if command is None:
+                    continue
+                writer.write(b'<ACK ID="%s" STATE="%s" />\r\n' % command.groups())
+                if command.group(1) == b'ENABLE_SEND_DATA' and command.group(2) == b'1':
+                    enabled.set()
+        except ConnectionError:
+            pass
+        finally:
+            streaming.cancel()
+            writer.close()
+
+    async def stream(self, writer: asyncio.StreamWriter, enabled: asyncio.Event) -> None:
+        """
+        Sends every record when it's due, a client that can't keep up slows the sending down through the socket
+        :param writer: asyncio stream writer
+        :param enabled: asyncio event: set once data is enabled
+        :return:
+        """
+        await enabled.wait()
+        loop = asyncio.get_running_loop()
+        starting_time = loop.time()
+        while self.records is None or self.sent < self.records:
+            await asyncio.sleep(SEND_EVERY + self.rng.uniform(0, self.jitter))
+            due = int((loop.time() - starting_time) * self.rate) - self.sent
+            if self.records is not None:
+                due = min(due, self.records - self.sent)
+            if due <= 0:
+                continue
+            data = b''.join(self.lines[(self.sent + i) % len(self.lines)] for i in range(due))
+            if self.partial:
+                cuts = np.sort(self.rng.integers(0, len(data), 3))
+                for part in np.split(np.frombuffer(data, dtype=np.uint8), cuts):
+                    writer.write(part.tobytes())
+                    await writer.drain()
+                    await asyncio.sleep(0)
+            else:
+                writer.write(data)
+                await writer.drain()
+            self.sent += due
+        await writer.drain()
+
+    async def serve(self, host: str, port: int, connections: int = None) -> None:
+        """
+        :param host: string
+        :param port: int
+        :param connections: int: number of connections to serve before stopping, None to serve forever
+        :return:
+        """
+        served = asyncio.Event()
+        count = 0
+
+        async def handle(reader, writer):
+            nonlocal count
+            await self.handle(reader, writer)
+            count += 1
+            if connections is not None and count >= connections:
+                served.set()
+
+        server = await asyncio.start_server(handle, host, port)
+        print(f'--- replaying {len(self.lines)} records at {self.rate:.0f} records/s on {host}:{port} ---')
+        async with server:
+            await served.wait()
+
+
+def session_lines(log_path: str = None, hz: int = 150, seconds: float = 60) -> list:
+    """
+    :param log_path: string: recording to replay (without the extension), None for a synthetic one
+    :param hz: int
+    :param seconds: float: length of the synthetic recording
+    :return: list: encoded REC lines
+    """
+    if log_path:
+        return record_lines(load_log(log_path))
+    return record_lines(generate_session(hz, seconds))
+
+
+def run_server(lines: list, hz: int, host: str, port: int, connections: int = None, **options) -> None:
+    """
+    Runs a replay server until it served its connections, in a process of its own for the load test
+    :return:
+    """
+    asyncio.run(ReplayServer(lines, hz, **options).serve(host, port, connections))
+
+
+def ingest_step(lines: list, fields: list, hz: int, speed: float, seconds: float, port: int, **options) -> dict:
+    """
+    Streams seconds worth of records at a speed through the recording's Feeder (stamping, live values, queue,
+    validity and the segment writer) and checks every one of them was written
+    :param lines: list: encoded REC lines
+    :param fields: list: variable names
+    :param hz: int
+    :param speed: float
+    :param seconds: float
+    :param port: int
+    :return: dict: the step's results
+    """
+    records = int(hz * speed * seconds)
+    server = multiprocessing.Process(target=run_server, args=(lines, hz, '127.0.0.1', port, 1),
+                                     kwargs={'speed': speed, 'records': records, **options})
+    server.start()
+    time.sleep(1)
+
+    tracker_loop = TrackerLoop()
+    feeder = Feeder('replay', True, None, fields + ['sim_time'], hz, 'npy', directory='.')
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # the recording and its run report are written like in a session, in a folder of their own
+        os.chdir(directory)
+        feed_thread = threading.Thread(target=feeder.setup_thread)
+        feed_thread.start()
+        client = GazepointClient('127.0.0.1', port, fields)
+        client.stream_to(feeder.receive)
+        try:
+            results = tracker_loop.submit(connect_all([client], ['ENABLE_SEND_POG_BEST'], 5)).result()
+            if results[0] is not None:
+                raise ConnectionError(f'replay server did not answer: {results[0]!r}')
+
+            # the records are sent at the speed asked for, a slow ingest makes them arrive later
+            deadline = time.perf_counter() + seconds * 3 + 5
+            while feeder.metrics.received + feeder.metrics.dropped < records and time.perf_counter() < deadline:
+                time.sleep(0.05)
+        finally:
+            # the client closes the connection, the server stops once it's closed
+            tracker_loop.call(feeder.stop)
+            tracker_loop.call(client.close)
+            tracker_loop.stop()
+            feed_thread.join()
+            os.chdir(cwd)
+            server.join(5)
+            if server.is_alive():
+                server.terminate()
+
+    metrics = feeder.metrics
+    elapsed = (metrics.last_written or 0) - (metrics.first_received or 0)
+    rate = metrics.written / elapsed if elapsed > 0 else 0
+    # a slow ingest doesn't lose records on the socket, it makes the sending take longer
+    kept_up = elapsed <= seconds * 1.1
+    result = {'speed': speed, 'rate': hz * speed, 'records': records, 'written': metrics.written,
+              'dropped': metrics.dropped, 'late': metrics.late, 'ingest_rate': round(rate),
+              'max_depth': metrics.max_depth}
+    result['sustained'] = result['written'] == records and result['dropped'] == 0 and kept_up
+    print(f'--- {speed}x ({hz * speed} records/s): written {result["written"]}/{records}, '
+          f'dropped {result["dropped"]}, {result["ingest_rate"]} records/s '
+          f'({"OK" if result["sustained"] else "LOST SAMPLES OR FELL BEHIND"}) ---')
+    return result
+
+
+def max_ingest_rate(lines: list, fields: list, hz: int, speeds: list = SPEEDS, seconds: float = STEP_SECONDS,
+                    port: int = 4343, **options) -> float:
+    """
+    Raises the speed until the ingest loses samples or falls behind
+    :param lines: list: encoded REC lines
+    :param fields: list: variable names
+    :param hz: int
+    :param speeds: list: multiples of the sensor rate to try, in order
+    :param seconds: float: seconds of streaming at every speed
+    :param port: int
+    :param options: jitter and partial
+    :return: float: the highest rate (records per second) that was sustained, 0 if none was
+    """
+    sustained = 0
+    for speed in speeds:
+        result = ingest_step(lines, fields, hz, speed, seconds, port, **options)
+        if not result['sustained']:
+            break
+        sustained = result['rate']
+    print(f'---=== maximum sustained ingest rate: {sustained} records/s '
+          f'({sustained / hz:.0f}x the sensor rate of {hz} hz) ===---')
+    return sustained
+
+
+if __name__ == '__main__':
+    # a local Gazepoint for the GUI (set host_ip to 127.0.0.1 in the config), or the load test of the ingest
+    log = input('recording to replay, without the extension (empty for a synthetic one)\n> ')
+    sensor_hz = int(input('hz (150)\n> ') or 150)
+    replay_lines = session_lines(log, sensor_hz)
+    if input('load test? (y/n)\n> ') == 'y':
+        max_ingest_rate(replay_lines, list(pd.read_csv('configs/commands.csv')['variable']), sensor_hz,
+                        jitter=float(input('jitter in seconds (0)\n> ') or 0),
+                        partial=input('partial packets? (y/n)\n> ') == 'y')
+    else:
+        run_server(replay_lines, sensor_hz, '0.0.0.0', int(input('port (4242)\n> ') or 4242),
+                   speed=float(input('speed (1)\n> ') or 1), jitter=float(input('jitter in seconds (0)\n> ') or 0),
+                   partial=input('partial packets? (y/n)\n> ') == 'y')
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import datetime
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not on Windows, the peak memory is left out there
+    resource = None
+
+# set to cprofile or pyinstrument (in the environment, or as "profile" in the config) to profile every stage,
+# the environment is passed on to the worker processes as well
+PROFILE_VARIABLE = 'GAZEPOINT_PROFILE'
+PROFILERS = ['cprofile', 'pyinstrument']
+# the reports are written next to the groups JSON of every session
+REPORT_DIR = 'analysis/jsons'
+
+
+def peak_rss() -> float:
+    """
+    :return: float: the largest memory the process has used so far in MB, None if it can't be measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on mac
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def start_profiler(profiler: str):
+    """
+    :param profiler: string: one of PROFILERS, anything else doesn't profile
+    :return: the running profiler, None if there's none (pyinstrument is optional)
+    """
+    if profiler == 'cprofile':
+        import cProfile
+        running = cProfile.Profile()
+        running.enable()
+        return running
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print('--- pyinstrument is not installed, not profiling ---')
+            return None
+        running = Profiler()
+        running.start()
+        return running
+    return None
+
+
+def stop_profiler(running, path: str) -> str:
+    """
+    Stops a profiler and saves what it found
+    :param running: the profiler start_profiler returned
+    :param path: string: file path without the extension
+    :return: string: the saved file
+    """
+    if hasattr(running, 'dump_stats'):
+        running.disable()
+        running.dump_stats(f'{path}.prof')
+        return f'{path}.prof'
+    running.stop()
+    with open(f'{path}.html', 'w') as f:
+        f.write(running.output_html())
+    return f'{path}.html'
+
+
+@contextmanager
+def stage(file_name: str, name: str, rows: int = None):
+    """
+    Measures a stage of a session and adds it to the session's run report (a JSON line per stage in
+    REPORT_DIR/NAME_run.jsonl, so stages running in parallel processes can all add to it), and prints the summary
+    Anything the stage adds to the yielded dict is reported as well (e.g. rows, once they're known)
+    :param file_name: string: the session
+    :param name: string: the stage
+    :param rows: int: rows the stage goes over
+    :return:
+    """
+    span = {'session': file_name, 'stage': name, 'pid': os.getpid(), 'rows': rows,
+            'started': datetime.datetime.now().isoformat(timespec='milliseconds')}
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    profiler = start_profiler(os.environ.get(PROFILE_VARIABLE, ''))
+    starting_time = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span['error'] = repr(e)
+        raise
+    finally:
+        seconds = time.perf_counter() - starting_time
+        span['seconds'] = round(seconds, 3)
+        span['rows_per_second'] = round(span['rows'] / seconds) if span['rows'] and seconds else None
+        span['peak_rss_mb'] = peak_rss()
+        if profiler is not None:
+            span['profile'] = stop_profiler(profiler, f'{REPORT_DIR}/{file_name}_{name.replace(" ", "_")}')
+
+        with open(f'{REPORT_DIR}/{file_name}_run.jsonl', 'a') as f:
+            f.write(json.dumps(span) + '\n')
+        print(f'---=== {name} {file_name}: {datetime.timedelta(seconds=seconds)}, {span["rows"]} rows '
+              f'({span["rows_per_second"]}/s), peak memory {span["peak_rss_mb"]} MB ===---')
+
+
+def load_report(file_name: str) -> list:
+    """
+    :param file_name: string: the session
+    :return: list: every stage reported for the session, in the order they finished
+    """
+    with open(f'{REPORT_DIR}/{file_name}_run.jsonl', 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
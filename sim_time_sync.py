@@ -0,0 +1,147 @@
+import threading
+import time
+
+# how often the simulator time is read from the database, in seconds
+SYNC_SECONDS = 5
+SIM_TABLE = 'dis.inGameTime'
+# how long the recordings wait for the first read before they start counting from 0
+FIRST_READ_TIMEOUT = 30
+
+
+class SimTimeSync:
+    def __init__(self, url: str, interval: float = SYNC_SECONDS, sim_table: str = SIM_TABLE):
+        """
+        Reads the latest simulator time from the database every few seconds on its own thread,
+        the recordings map it onto the sensor's timestamps so nothing waits for the database per record
+        :param url: string: SQLAlchemy database URL (e.g. sqlite:///sim.db for testing)
+        :param interval: float: seconds between reads
+        :param sim_table: string: [schema.]table with the sim_time and WorldTime columns
+        """
+        # sqlalchemy is imported once the trackers are connected, not while the GUI is starting
+        from sqlalchemy import create_engine, table, column, select
+
+        self.interval = interval
+        # the engine keeps a small pool of connections that are checked before use instead of one open connection
+        self.engine = create_engine(url, pool_pre_ping=True, pool_recycle=3600)
+        schema, _, name = sim_table.rpartition('.')
+        sim_times = table(name, column('sim_time'), column('WorldTime'), schema=schema or None)
+        self.query = select(sim_times.c.sim_time).order_by(sim_times.c.WorldTime.desc()).limit(1)
+
+        # the latest simulator time, the monotonic time it was read at and how many reads there were
+        self.latest = (None, None, 0)
+        self.first_read = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def read(self) -> None:
+        """
+        Reads the simulator time once, failures are printed and the previous time is kept
+        (anything else than a database error as well, e.g. a sim_time column that isn't a number)
+        :return:
+        """
+        from sqlalchemy.exc import SQLAlchemyError
+
+        try:
+            with self.engine.connect() as connection:
+                sim_time = connection.execute(self.query).scalar()
+            if sim_time is not None:
+                self.latest = (float(sim_time), time.monotonic(), self.latest[2] + 1)
+        except SQLAlchemyError as e:
+            print(f'--- failed reading sim_time: {e.__class__.__name__} ---')
+        except Exception as e:
+            print(f'--- failed reading sim_time: {e!r} ---')
+
+    def _run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.read()
+            finally:
+                # the recordings wait for the first read, even one that failed
+                self.first_read.set()
+            self.stopped.wait(self.interval)
+
+    def start(self) -> None:
+        """
+        Starts reading in the background, first_read is set once the first read was tried
+        so the recordings can wait for it and start synced
+        :return:
+        """
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.engine.dispose()
+
+
+class SimTimeMapping:
+    def __init__(self, sync: SimTimeSync, tick: float):
+        """
+        Maps the timestamps of one sensor onto the simulator time, between reads of the database the sensor's
+        own clock moves the time forward and every new read corrects the drift
+        The first read moves the mapping straight to the simulator time, every later correction is spread over
+        the next sync interval of the sensor's clock so the times keep increasing (and they never go below
+        a time already stamped)
+        :param sync: SimTimeSync, None to count from 0
+        :param tick: float: seconds between records, for sensors that don't send their time
+        """
+        self.sync = sync
+        self.tick = tick
+        self.records = 0
+        self.reads = -1
+        self.synced = False
+        # simulator time minus sensor time, and the correction being added to it from correction_from on
+        self.offset = None
+        self.correction = 0.0
+        self.correction_from = 0.0
+        self.last = float('-inf')
+
+    def offset_at(self, sensor_time: float) -> float:
+        """
+        :param sensor_time: float
+        :return: float: the offset with the part of the correction that's due by then
+        """
+        if not self.correction:
+            return self.offset
+        interval = self.sync.interval if self.sync is not None else SYNC_SECONDS
+        due = min(max((sensor_time - self.correction_from) / interval, 0.0), 1.0)
+        return self.offset + self.correction * due
+
+    def stamp(self, records: list, time_index: int) -> list:
+        """
+        Called for every chunk, starts correcting the mapping to the latest read of the database if there's
+        a new one
+        :param records: list: the values of every record in the chunk
+        :param time_index: int: index of the sensor's TIME variable, None if it isn't sent
+        :return: list: the simulator time of every record
+        """
+        if time_index is None:
+            sensor_times = [(self.records + i) * self.tick for i in range(1, len(records) + 1)]
+        else:
+            sensor_times = [float(values[time_index]) for values in records]
+        self.records += len(records)
+        if not sensor_times:
+            return sensor_times
+
+        if self.offset is None:
+            # until the database is read the recording counts from 0
+            self.offset = self.tick - sensor_times[0]
+        if self.sync is not None:
+            sim_time, read_at, reads = self.sync.latest
+            if reads != self.reads and sim_time is not None:
+                # the last record in the chunk was just received, the simulator time now is the one that was read
+                # plus the time since it was read
+                target = sim_time + time.monotonic() - read_at - sensor_times[-1]
+                if self.synced:
+                    self.offset = self.offset_at(sensor_times[-1])
+                    self.correction = target - self.offset
+                    self.correction_from = sensor_times[-1]
+                else:
+                    self.offset, self.correction, self.synced = target, 0.0, True
+                self.reads = reads
+
+        stamps = []
+        for sensor_time in sensor_times:
+            self.last = max(sensor_time + self.offset_at(sensor_time), self.last)
+            stamps.append(self.last)
+        return stamps
@@ -0,0 +1,79 @@
+import sys
+import time
+import statistics
+import subprocess
+
+# modules only the later stages need, none of them should be imported before the GUI is shown
+HEAVY_MODULES = ['matplotlib', 'scipy', 'PIL', 'pywt', 'numba', 'sqlalchemy', 'pyodbc',
+                 'cognitive_load', 'export_visuals', 'heatmap_smoothing', 'live_load']
+# longest the GUI may take to show its window, in seconds
+STARTUP_BUDGET = 2.0
+RUNS = 5
+
+# runs in a fresh interpreter, so nothing is imported already
+IMPORT_PROBE = '''
+import sys
+import time
+starting_time = time.perf_counter()
+import {module}
+print(time.perf_counter() - starting_time)
+print(','.join(sorted({{name.split('.')[0] for name in sys.modules}})))
+'''
+
+
+def measure_imports(module: str = 'main', runs: int = RUNS) -> dict:
+    """
+    Imports a module in fresh interpreters, main runs everything before the GUI is created (config, commands csv)
+    :param module: string
+    :param runs: int
+    :return: dict: median seconds and the heavy modules the import loaded
+    """
+    seconds = []
+    heavy = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE.format(module=module)],
+                                capture_output=True, text=True, check=True).stdout.split('\n')
+        seconds.append(float(output[0]))
+        heavy = [name for name in HEAVY_MODULES if name in output[1].split(',')]
+    result = {'module': module, 'seconds': statistics.median(seconds), 'heavy': heavy}
+    print(f'--- importing {module}: {result["seconds"]:.3f} s (median of {runs}), '
+          f'heavy modules: {", ".join(heavy) or "none"} ---')
+    return result
+
+
+def measure_launch(command: list, runs: int = RUNS) -> float:
+    """
+    Launches the GUI with --startup (it quits as soon as the window is shown) and times it from start to exit,
+    for the EXE this includes unpacking it
+    :param command: list: e.g. [sys.executable, 'main.py'] or ['EXE/Gazepoint.exe']
+    :param runs: int
+    :return: float: median seconds
+    """
+    seconds = []
+    for _ in range(runs):
+        starting_time = time.perf_counter()
+        subprocess.run(command + ['--startup'], check=True)
+        seconds.append(time.perf_counter() - starting_time)
+    median = statistics.median(seconds)
+    print(f'--- launching {" ".join(command)}: {median:.3f} s (median of {runs}) ---')
+    return median
+
+
+def check_startup(command: list = None, budget: float = STARTUP_BUDGET, runs: int = RUNS) -> bool:
+    """
+    :param command: list: the GUI to launch, only the imports are measured if None
+    :param budget: float: seconds
+    :param runs: int
+    :return: bool: whether the GUI starts within the budget without importing the later stages
+    """
+    imports = measure_imports(runs=runs)
+    seconds = measure_launch(command, runs) if command else imports['seconds']
+    passed = not imports['heavy'] and seconds <= budget
+    print(f'---=== startup {seconds:.3f} s, budget {budget} s ({"OK" if passed else "TOO SLOW"}) ===---')
+    return passed
+
+
+if __name__ == '__main__':
+    # run from the folder with configs, e.g. "EXE/Gazepoint.exe" to measure the built EXE
+    exe = input('command to launch (empty for main.py)\n> ')
+    sys.exit(not check_startup(exe.split() if exe else [sys.executable, 'main.py']))
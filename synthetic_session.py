@@ -0,0 +1,116 @@
+from log_files import save_log
+
+import numpy as np
+import pandas as pd
+
+# the pupil size of a resting eye and how much a blink or a break (looking away) lasts, in seconds
+PUPIL_MM = 3.5
+BLINK_SECONDS = (0.1, 0.4)
+BREAK_SECONDS = (1.0, 4.0)
+
+
+def command_fields(commands: str = 'commands') -> list:
+    """
+    :param commands: string: name of the commands csv in configs
+    :return: list: the variables a recording has, in order
+    """
+    return list(pd.read_csv(f'configs/{commands}.csv')['variable'])
+
+
+def invalid_spans(rng: np.random.Generator, rows: int, count: int, hz: int, seconds: tuple) -> np.ndarray:
+    """
+    :param rng: numpy random generator
+    :param rows: int: rows in the recording
+    :param count: int: number of spans
+    :param hz: int
+    :param seconds: tuple: shortest and longest span
+    :return: numpy array: bool mask of the rows inside the spans
+    """
+    mask = np.zeros(rows + 1, dtype=int)
+    starts = rng.integers(1, rows, count)
+    ends = np.minimum(starts + (rng.uniform(*seconds, count) * hz).astype(int), rows)
+    np.add.at(mask, starts, 1)
+    np.add.at(mask, ends, -1)
+    return np.cumsum(mask)[:rows] > 0
+
+
+def generate_session(hz: int, seconds: float, blink_rate: float = 15, dropout: float = 0.02, seed: int = 0,
+                     fields: list = None) -> pd.DataFrame:
+    """
+    A synthetic recording as it's saved after the stream is stopped: fixations with saccades between them,
+    slowly changing pupils, blinks and longer breaks where both pupils are invalid
+    :param hz: int
+    :param seconds: float: length of the recording
+    :param blink_rate: float: blinks per minute
+    :param dropout: float: part of the recording lost to breaks (0 to 1)
+    :param seed: int
+    :param fields: list: variables of the recording, the commands csv by default
+    :return: dataframe: CNT, the variables and sim_time
+    """
+    rng = np.random.default_rng(seed)
+    fields = command_fields() if fields is None else fields
+    rows = int(hz * seconds)
+    sim_time = np.arange(1, rows + 1) / hz
+
+    # fixations of about 300 ms around the middle of the screen
+    durations = np.maximum((rng.exponential(0.3, rows // max(int(0.3 * hz), 1) + 2) * hz).astype(int), 1)
+    # cutting to whole rows makes the fixations shorter than drawn, more are drawn until they cover the recording
+    while durations.sum() < rows:
+        durations = np.concatenate((durations, np.maximum((rng.exponential(0.3, len(durations) // 10 + 2) * hz)
+                                                          .astype(int), 1)))
+    durations = durations[:np.searchsorted(np.cumsum(durations), rows) + 1]
+    centers = np.clip(rng.normal(0.5, 0.2, (len(durations), 2)), 0.01, 0.99)
+    gaze = np.repeat(centers, durations, axis=0)[:rows] + rng.normal(0, 0.003, (rows, 2))
+    gaze = np.clip(gaze, 0.001, 1)
+
+    pupil = PUPIL_MM + 0.3 * np.sin(2 * np.pi * sim_time / 120) + rng.normal(0, 0.05, rows)
+    blinks = invalid_spans(rng, rows, int(blink_rate * seconds / 60), hz, BLINK_SECONDS)
+    breaks = invalid_spans(rng, rows, int(dropout * seconds / np.mean(BREAK_SECONDS)), hz, BREAK_SECONDS)
+    valid = ~(blinks | breaks)
+
+    offsets = rng.normal(0, 0.01, (rows, 2))
+    columns = {
+        'BPOGX': gaze[:, 0], 'BPOGY': gaze[:, 1], 'BPOGV': valid,
+        'LPOGX': gaze[:, 0] - 0.01 + offsets[:, 0], 'LPOGY': gaze[:, 1] + offsets[:, 1], 'LPOGV': valid,
+        'RPOGX': gaze[:, 0] + 0.01 - offsets[:, 0], 'RPOGY': gaze[:, 1] - offsets[:, 1], 'RPOGV': valid,
+        'LPCX': 0.4 + 0.05 * gaze[:, 0], 'LPCY': 0.5 + 0.05 * gaze[:, 1], 'LPD': 20 * pupil / PUPIL_MM,
+        'LPS': np.ones(rows), 'LPV': valid,
+        'RPCX': 0.6 + 0.05 * gaze[:, 0], 'RPCY': 0.5 + 0.05 * gaze[:, 1], 'RPD': 20 * (pupil + 0.1) / PUPIL_MM,
+        'RPS': np.ones(rows), 'RPV': valid,
+        'LPMM': np.where(valid, pupil, 0), 'LPMMV': valid,
+        'RPMM': np.where(valid, pupil + 0.1, 0), 'RPMMV': valid,
+        'TIME': sim_time,
+    }
+
+    df = pd.DataFrame({'CNT': np.arange(rows)})
+    for field in fields:
+        if field in columns:
+            values = columns[field]
+        elif field.endswith('V'):
+            values = valid
+        else:
+            values = rng.uniform(0.2, 0.8, rows)
+        df[field] = values.astype(int) if values.dtype == bool else values
+    df['sim_time'] = sim_time
+    return df
+
+
+def write_session(file_name: str, hz: int, seconds: float, log_format: str = 'csv', **options) -> int:
+    """
+    Writes a synthetic recording to the csv logs folder, ready to be cleaned
+    :param file_name: string
+    :param hz: int
+    :param seconds: float
+    :param log_format: string: csv/npy
+    :param options: the rest of generate_session's parameters
+    :return: int: number of rows
+    """
+    df = generate_session(hz, seconds, **options)
+    save_log(df, f'csv logs/{file_name}', log_format)
+    return len(df.index)
+
+
+if __name__ == '__main__':
+    # a synthetic recording to try the cleaning and analysis with
+    rows = write_session(input('file_name\n> '), int(input('hz\n> ')), float(input('seconds\n> ')))
+    print(f'--- wrote {rows} rows ---')